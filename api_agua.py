@@ -0,0 +1,278 @@
+# ====================================================
+# API HTTP local del modelo de redistribución de agua
+# Uso: python api_agua.py [--host 127.0.0.1] [--puerto 8600] [--cache-mb 256]
+#
+#   GET  /salud          -> estado y tamaño de los datos cargados
+#   POST /asignar        -> un punto {"x","y","demanda"} o {"sector"} / {"distrito"}
+#   POST /asignar/lote   -> muchos puntos {"x":[...],"y":[...],"demanda":[...]}
+#                           o {"puntos":[{"x","y","demanda"}, ...]}
+# Parámetros comunes: "escenario" (%), "cisterna" ("19 m³" o 19), "consumo_gal_h",
+# "costo_galon", "velocidad_kmh" y "filtros" (pozos elegibles, p. ej. {"Uso": ["Industrial"],
+# "Fuente": ["Acuifero RIMAC"]}). Respuesta JSON, o Arrow IPC con ?formato=arrow
+# (o cabecera Accept: application/vnd.apache.arrow.stream).
+# ====================================================
+
+import argparse
+import hashlib
+import json
+import threading
+import traceback
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+import pandas as pd
+
+from modelo_agua import (
+    DATA_DIR, cisternas, PARAMETROS_COSTO, NIVELES, normalizar, cargar_datos, arreglos_pozos,
+    factores_costo, asignar, asignar_bloque, IndiceFacetas,
+)
+
+TIPO_JSON = "application/json; charset=utf-8"
+TIPO_ARROW = "application/vnd.apache.arrow.stream"
+RUTAS = ("/asignar", "/asignar/lote")
+MINIMOS_COSTO = {"velocidad_kmh": 1.0}  # como en el dashboard; 0 daría costos infinitos
+
+
+class ErrorSolicitud(ValueError):
+    """Solicitud inválida (se responde con HTTP 400)."""
+
+
+# ========= MOTOR =========
+class MotorAsignacion:
+    """Datos en memoria y caché de respuestas alrededor de modelo_agua."""
+
+    def __init__(self, data_dir=DATA_DIR, max_cache_mb=256):
+        self.sectores_gdf, self.distritos_gdf, self.pozos_gdf = cargar_datos(data_dir)
+        self.pozos = arreglos_pozos(self.pozos_gdf)
+        self.indice = IndiceFacetas(self.pozos_gdf, self.pozos[0])
+        # Centroide y demanda por nombre normalizado, para consultas por sector o distrito
+        self.objetivos = {}
+        for nivel, gdf in (("Sector", self.sectores_gdf), ("Distrito", self.distritos_gdf)):
+            col_nombre, col_dem = NIVELES[nivel]
+            c = gdf.geometry.centroid
+            self.objetivos[nivel] = {
+                n: (float(x), float(y), float(d) if pd.notna(d) else 0.0)
+                for n, x, y, d in zip(gdf[col_nombre], c.x, c.y, gdf[col_dem])
+            }
+        # Caché limitada por tamaño: las respuestas de más de 1/16 del total no se guardan
+        self.max_cache = int(max_cache_mb * 2**20)
+        self._cache, self._bytes = OrderedDict(), 0
+        self._lock = threading.Lock()
+
+    # --- Caché LRU de respuestas ya codificadas (clave: sha256 del cuerpo canónico) ---
+    def responder(self, ruta, cuerpo, formato="json"):
+        canonico = json.dumps(cuerpo, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        clave = (ruta, formato, hashlib.sha256(canonico).digest())
+        with self._lock:
+            if clave in self._cache:
+                self._cache.move_to_end(clave)
+                return self._cache[clave]
+        if ruta == "/asignar":
+            df, extra = self.asignar_punto(cuerpo)
+        elif ruta == "/asignar/lote":
+            df, extra = self.asignar_lote(cuerpo), {}
+        else:
+            raise ErrorSolicitud(f"ruta desconocida: {ruta}")
+        respuesta = codificar(df, extra, formato)
+        if len(respuesta[1]) <= self.max_cache // 16:
+            with self._lock:
+                if clave not in self._cache:
+                    self._cache[clave] = respuesta
+                    self._bytes += len(respuesta[1])
+                while self._bytes > self.max_cache:
+                    self._bytes -= len(self._cache.popitem(last=False)[1][1])
+        return respuesta
+
+    def salud(self):
+        return {"estado": "ok", "pozos": int(len(self.pozos[0])),
+                "sectores": len(self.objetivos["Sector"]), "distritos": len(self.objetivos["Distrito"]),
+                "facetas": list(self.indice.valores)}
+
+    def leer_filtros(self, cuerpo):
+        # Máscara de pozos elegibles según "filtros" ({faceta: [valores]}); None = todos
+        filtros = cuerpo.get("filtros") or {}
+        if not isinstance(filtros, dict) or not all(isinstance(v, list) for v in filtros.values()):
+            raise ErrorSolicitud("'filtros' debe ser un objeto {faceta: [valores]}")
+        try:
+            return self.indice.mascara(self.indice.bits(filtros))
+        except ValueError as e:
+            raise ErrorSolicitud(str(e))
+
+    # --- Endpoints ---
+    def asignar_punto(self, cuerpo):
+        escenario, tipo, gal_km, soles_km = leer_parametros(cuerpo)
+        mascara = self.leer_filtros(cuerpo)
+        if "sector" in cuerpo or "distrito" in cuerpo:
+            nivel = "Sector" if "sector" in cuerpo else "Distrito"
+            nombre = normalizar(cuerpo[nivel.lower()])
+            if nombre not in self.objetivos[nivel]:
+                raise ErrorSolicitud(f"{nivel} desconocido: {nombre}")
+            x, y, demanda = self.objetivos[nivel][nombre]
+            demanda = leer_numero(cuerpo, "demanda", demanda, minimo=0.0)
+        else:
+            x, y = leer_numero(cuerpo, "x"), leer_numero(cuerpo, "y")
+            demanda = leer_numero(cuerpo, "demanda", minimo=0.0)
+        a = asignar(x, y, demanda, escenario, tipo, self.pozos, mascara).valorizar(gal_km, soles_km)
+        viajes, costo, consumo = a.totales()
+        df = a.tabla().rename(columns=str.lower)
+        extra = {
+            "demanda": demanda,
+            "faltante": max(a.restante, 0.0),
+            "cobertura_pct": (1 - a.restante/demanda)*100 if demanda > 0 else 0.0,
+            "viajes": viajes,
+            "costo": costo,
+            "consumo": consumo,
+        }
+        return df, extra
+
+    def asignar_lote(self, cuerpo):
+        escenario, tipo, gal_km, soles_km = leer_parametros(cuerpo)
+        mascara = self.leer_filtros(cuerpo)
+        if "puntos" in cuerpo:
+            puntos = cuerpo["puntos"]
+            if not isinstance(puntos, list):
+                raise ErrorSolicitud("'puntos' debe ser una lista")
+            cols = {c: [p.get(c) if isinstance(p, dict) else None for p in puntos] for c in ("x", "y", "demanda")}
+        else:
+            cols = {c: cuerpo.get(c) for c in ("x", "y", "demanda")}
+        try:
+            x, y, demanda = (np.asarray(cols[c], dtype=float) for c in ("x", "y", "demanda"))
+        except (TypeError, ValueError):
+            raise ErrorSolicitud("'x', 'y' y 'demanda' deben ser listas numéricas")
+        if not (x.ndim == y.ndim == demanda.ndim == 1 and len(x) == len(y) == len(demanda)):
+            raise ErrorSolicitud("'x', 'y' y 'demanda' deben tener la misma longitud")
+        if not np.isfinite(np.r_[x, y, demanda]).all() or (demanda < 0).any():
+            raise ErrorSolicitud("coordenadas y demandas deben ser finitas y la demanda >= 0")
+
+        viajes, km, faltante = np.zeros(len(x)), np.zeros(len(x)), demanda.copy()
+        bloque = max(1, 2**23 // max(len(self.pozos[0]), 1))
+        for a in range(0, len(x), bloque):
+            s = slice(a, a + bloque)
+            viajes[s], km[s], faltante[s] = asignar_bloque(x[s], y[s], demanda[s], escenario, tipo, self.pozos,
+                                                           mascara=mascara)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cobertura = np.where(demanda > 0, (1 - faltante/demanda)*100, 0.0)
+        return pd.DataFrame({
+            "x": x, "y": y, "demanda": demanda, "viajes": viajes.astype(int),
+            "costo": km * soles_km, "consumo": km * gal_km,
+            "faltante": faltante, "cobertura_pct": cobertura,
+        })
+
+
+# ========= PARÁMETROS Y CODIFICACIÓN =========
+def leer_numero(cuerpo, campo, defecto=None, minimo=None):
+    valor = cuerpo.get(campo, defecto)
+    if valor is None:
+        raise ErrorSolicitud(f"falta el campo '{campo}'")
+    try:
+        valor = float(valor)
+    except (TypeError, ValueError):
+        raise ErrorSolicitud(f"'{campo}' debe ser numérico")
+    if not np.isfinite(valor) or (minimo is not None and valor < minimo):
+        raise ErrorSolicitud(f"'{campo}' fuera de rango")
+    return valor
+
+def leer_cisterna(valor):
+    # Acepta la clave ("19 m³") o la capacidad (19)
+    if isinstance(valor, bool) or not isinstance(valor, (str, int, float)):
+        raise ErrorSolicitud("'cisterna' debe ser texto o número")
+    if valor in cisternas:
+        return valor
+    for tipo, cfg in cisternas.items():
+        if str(valor).strip() == str(cfg["capacidad"]):
+            return tipo
+    raise ErrorSolicitud(f"cisterna desconocida: {valor}; opciones: {list(cisternas)}")
+
+def leer_parametros(cuerpo):
+    if not isinstance(cuerpo, dict):
+        raise ErrorSolicitud("el cuerpo debe ser un objeto JSON")
+    escenario = leer_numero(cuerpo, "escenario", 20, minimo=0.0)
+    if escenario > 100:
+        raise ErrorSolicitud("'escenario' debe estar entre 0 y 100")
+    tipo = leer_cisterna(cuerpo.get("cisterna", next(iter(cisternas))))
+    p = {c: leer_numero(cuerpo, c, v, minimo=MINIMOS_COSTO.get(c, 0.0)) for c, v in PARAMETROS_COSTO.items()}
+    gal_km, soles_km = factores_costo(p["consumo_gal_h"], p["costo_galon"], p["velocidad_kmh"])
+    return escenario, tipo, gal_km, soles_km
+
+def codificar(df, extra, formato):
+    # (tipo de contenido, bytes) de la respuesta
+    if formato == "arrow":
+        import pyarrow as pa
+        tabla = pa.Table.from_pandas(df, preserve_index=False)
+        tabla = tabla.replace_schema_metadata({k: json.dumps(v) for k, v in extra.items()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, tabla.schema) as writer:
+            writer.write_table(tabla)
+        return TIPO_ARROW, sink.getvalue().to_pybytes()
+    clave = "pozos" if extra else "resultados"
+    cuerpo = dict(extra, **{clave: df.to_dict(orient="records")})
+    return TIPO_JSON, json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+
+
+# ========= SERVIDOR =========
+class ManejadorAPI(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # conexiones persistentes
+    disable_nagle_algorithm = True  # cabeceras y cuerpo van en escrituras separadas
+    motor = None
+
+    def log_message(self, *args):
+        pass
+
+    def _enviar(self, estado, tipo, datos):
+        self.send_response(estado)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _error(self, estado, mensaje):
+        self._enviar(estado, TIPO_JSON, json.dumps({"error": mensaje}, ensure_ascii=False).encode("utf-8"))
+
+    def do_GET(self):
+        if urlsplit(self.path).path == "/salud":
+            self._enviar(200, TIPO_JSON, json.dumps(self.motor.salud()).encode("utf-8"))
+        else:
+            self._error(404, "ruta no encontrada")
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path not in RUTAS:
+            return self._error(404, "ruta no encontrada")
+        formato = parse_qs(url.query).get("formato", ["json"])[0]
+        if TIPO_ARROW in self.headers.get("Accept", ""):
+            formato = "arrow"
+        try:
+            largo = int(self.headers.get("Content-Length", 0))
+            cuerpo = json.loads(self.rfile.read(largo) or b"{}")
+        except (ValueError, UnicodeDecodeError):
+            return self._error(400, "JSON inválido")
+        if formato not in ("json", "arrow"):
+            return self._error(400, "formato debe ser 'json' o 'arrow'")
+        try:
+            tipo, datos = self.motor.responder(url.path, cuerpo, formato)
+        except ErrorSolicitud as e:
+            return self._error(400, str(e))
+        except ImportError:
+            return self._error(406, "formato Arrow no disponible (instalar pyarrow)")
+        except Exception as e:  # nunca cortar la conexión sin respuesta
+            traceback.print_exc()
+            return self._error(500, f"error interno: {type(e).__name__}")
+        self._enviar(200, tipo, datos)
+
+
+def crear_servidor(host="127.0.0.1", puerto=8600, motor=None):
+    ManejadorAPI.motor = motor or MotorAsignacion()
+    return ThreadingHTTPServer((host, puerto), ManejadorAPI)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API local del modelo de redistribución de agua")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8600)
+    parser.add_argument("--cache-mb", type=float, default=256, help="tamaño máximo de la caché de respuestas")
+    args = parser.parse_args()
+    servidor = crear_servidor(args.host, args.puerto, MotorAsignacion(max_cache_mb=args.cache_mb))
+    print(f"API escuchando en http://{args.host}:{args.puerto}")
+    servidor.serve_forever()
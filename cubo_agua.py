@@ -0,0 +1,141 @@
+# ====================================================
+# CUBO DE ESCENARIOS: resultados precalculados
+# Uso: python cubo_agua.py [--procesos N] [--salida RUTA]
+#
+# Precalcula, para cada escenario y tipo de cisterna, la asignación de todos los
+# sectores, todos los distritos y la combinación crítica, y la guarda en un .npz
+# indexado junto con la huella de los datos de entrada. Se guardan viajes y km
+# (no soles ni galones): los parámetros de costo solo reescalan el resultado.
+# ====================================================
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from modelo_agua import (
+    DATA_DIR, cisternas, ESCENARIOS, CRITICOS, Asignacion, cargar_datos, arreglos_pozos,
+    asignar, asignar_objetivos, tablas_lote, objetivo_combinacion, clave_combinacion,
+)
+
+CUBO_VERSION = 1
+ARCHIVO_CUBO = os.path.join(DATA_DIR, "cubo_escenarios.npz")
+ARCHIVOS_DATOS = ["Sectores.geojson", "DISTRITOS_Final.geojson", "Pozos.geojson",
+                  "Demandas_Sectores_30lhd.csv", "Demandas_Distritos_30lhd.csv"]
+CAMPOS = ["idx", "pozo_id", "aporte", "viajes", "km", "dist_km"]
+
+
+def huella_datos(data_dir=DATA_DIR):
+    # Hash de los archivos de entrada y del espacio de parámetros del cubo
+    h = hashlib.sha256()
+    for nombre in ARCHIVOS_DATOS:
+        with open(os.path.join(data_dir, nombre), "rb") as f:
+            h.update(f.read())
+    h.update(json.dumps([CUBO_VERSION, cisternas, ESCENARIOS, CRITICOS]).encode("utf-8"))
+    return h.hexdigest()
+
+
+# ========= CONSTRUCCIÓN (en paralelo) =========
+_datos = None
+
+def _iniciar(data_dir):
+    # Cada proceso carga los datos una sola vez
+    global _datos
+    sectores_gdf, distritos_gdf, pozos_gdf = cargar_datos(data_dir)
+    _datos = (sectores_gdf, distritos_gdf, arreglos_pozos(pozos_gdf))
+
+def _calcular(tarea):
+    nivel, escenario, tipo = tarea
+    sectores_gdf, distritos_gdf, pozos = _datos
+    if nivel == "Combinación":
+        geom, demanda = objetivo_combinacion(distritos_gdf, CRITICOS)
+        c = geom.centroid
+        partes = [(clave_combinacion(CRITICOS), asignar(c.x, c.y, demanda, escenario, tipo, pozos))]
+    else:
+        gdf = sectores_gdf if nivel == "Sector" else distritos_gdf
+        partes = asignar_objetivos(gdf, nivel, escenario, tipo, pozos)
+    return tarea, partes
+
+def construir_cubo(data_dir=DATA_DIR, salida=ARCHIVO_CUBO, procesos=None):
+    tareas = [(nivel, esc, tipo) for nivel in ("Sector", "Distrito", "Combinación")
+              for esc in ESCENARIOS for tipo in cisternas]
+    indice, detalle = [], {c: [] for c in CAMPOS}
+    inicio = 0
+    with ProcessPoolExecutor(max_workers=procesos or os.cpu_count(),
+                             initializer=_iniciar, initargs=(data_dir,)) as ex:
+        for (nivel, esc, tipo), partes in ex.map(_calcular, tareas):
+            for nombre, a in partes:
+                indice.append((nivel, esc, tipo, str(nombre), inicio, inicio + len(a), a.demanda, a.restante))
+                for c in CAMPOS:
+                    detalle[c].append(getattr(a, c))
+                inicio += len(a)
+    columnas = list(zip(*indice))
+    tmp = salida + ".tmp.npz"
+    np.savez_compressed(
+        tmp,
+        meta=np.array(json.dumps({"huella": huella_datos(data_dir), "version": CUBO_VERSION})),
+        nivel=np.array(columnas[0]), escenario=np.array(columnas[1], dtype=np.int16),
+        cisterna=np.array(columnas[2]), objetivo=np.array(columnas[3]),
+        inicio=np.array(columnas[4], dtype=np.int64), fin=np.array(columnas[5], dtype=np.int64),
+        demanda=np.array(columnas[6], dtype=float), restante=np.array(columnas[7], dtype=float),
+        idx=np.concatenate(detalle["idx"]).astype(np.int32),
+        pozo_id=np.concatenate(detalle["pozo_id"]).astype(np.int32),
+        aporte=np.concatenate(detalle["aporte"]), viajes=np.concatenate(detalle["viajes"]).astype(np.int32),
+        km=np.concatenate(detalle["km"]), dist_km=np.concatenate(detalle["dist_km"]),
+    )
+    os.replace(tmp, salida)
+    return salida
+
+
+# ========= LECTURA =========
+class CuboEscenarios:
+    """Consultas directas sobre el cubo: (nivel, escenario, cisterna, objetivo) -> Asignacion."""
+
+    def __init__(self, arreglos):
+        self.a = arreglos
+        self.indice, self.lotes = {}, {}
+        for fila, clave in enumerate(zip(self.a["nivel"].tolist(), self.a["escenario"].tolist(),
+                                         self.a["cisterna"].tolist(), self.a["objetivo"].tolist())):
+            self.indice[clave] = fila
+            self.lotes.setdefault(clave[:3], []).append(fila)
+
+    def _asignacion(self, fila):
+        a, ini, fin = self.a, self.a["inicio"][fila], self.a["fin"][fila]
+        return Asignacion(a["idx"][ini:fin], a["pozo_id"][ini:fin], a["aporte"][ini:fin],
+                          a["viajes"][ini:fin], a["km"][ini:fin], a["dist_km"][ini:fin],
+                          float(a["demanda"][fila]), float(a["restante"][fila]))
+
+    def asignacion(self, nivel, objetivo, escenario, tipo_cisterna):
+        fila = self.indice.get((nivel, int(escenario), tipo_cisterna, str(objetivo)))
+        return None if fila is None else self._asignacion(fila)
+
+    def lote(self, nivel, escenario, tipo_cisterna):
+        filas = self.lotes.get((nivel, int(escenario), tipo_cisterna))
+        if filas is None:
+            return None
+        return tablas_lote(nivel, [(self.a["objetivo"][f], self._asignacion(f)) for f in filas])
+
+def cargar_cubo(ruta=ARCHIVO_CUBO, data_dir=DATA_DIR):
+    # El cubo solo se usa si existe y coincide con la huella de los datos actuales
+    if not os.path.exists(ruta):
+        return None
+    with np.load(ruta) as z:
+        arreglos = {k: z[k] for k in z.files}
+    meta = json.loads(str(arreglos.pop("meta")))
+    if meta.get("version") != CUBO_VERSION or meta.get("huella") != huella_datos(data_dir):
+        return None
+    return CuboEscenarios(arreglos)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precalcula el cubo de escenarios del modelo")
+    parser.add_argument("--procesos", type=int, default=None, help="procesos en paralelo (por defecto, todos los núcleos)")
+    parser.add_argument("--salida", default=ARCHIVO_CUBO)
+    args = parser.parse_args()
+    t0 = time.time()
+    ruta = construir_cubo(salida=args.salida, procesos=args.procesos)
+    print(f"Cubo guardado en {ruta} ({os.path.getsize(ruta)/1024:,.0f} KB, {time.time()-t0:.1f} s)")
@@ -6,13 +6,9 @@
 
 import streamlit as st
 import os
-import pandas as pd
-import geopandas as gpd
-import folium
-from shapely.ops import unary_union
-from streamlit_folium import st_folium
-import plotly.express as px
-from folium import plugins
+import hashlib
+import tempfile
+import time
 
 # --- CONFIGURACIÓN DE PÁGINA ---
 st.set_page_config(
@@ -37,6 +33,18 @@ if not st.session_state["auth"]:
             st.error("Credenciales inválidas")
     st.stop()
 
+# --- DEPENDENCIAS DEL MODELO (después del login; mapas y gráficos se importan en cada modo) ---
+import numpy as np
+import pandas as pd
+from modelo_agua import (
+    DATA_DIR, cisternas, ESCENARIOS, PARAMETROS_COSTO, cargar_datos,
+    CRITICOS, factores_costo, asignar, asignar_lote, pozos_necesarios, asignar_bloque,
+    flota_mixta, IndiceFacetas,
+    objetivo_combinacion, clave_combinacion,
+)
+from cubo_agua import cargar_cubo
+import modelo_agua
+
 # --- ENCABEZADO PRINCIPAL ---
 st.markdown(
     """
@@ -52,12 +60,6 @@ st.markdown(
 # --- ESPACIO VISUAL ---
 st.markdown("<br>", unsafe_allow_html=True)
 
-# --- RUTA LOCAL ---
-data_dir = os.path.join(os.path.dirname(__file__), "Datos_qgis")
-
-# --- CONFIG CISERNAS ---
-cisternas = {"19 m³": {"capacidad": 19}, "34 m³": {"capacidad": 34}}
-
 # ========= ESTILO DE LA SIDEBAR =========
 st.markdown("""
 <style>
@@ -73,51 +75,166 @@ st.sidebar.header("⚙️ Configuración del análisis")
 
 modo = st.sidebar.radio(
     "Seleccionar nivel de análisis",
-    ["Sector", "Distrito", "Combinación Distritos", "Resumen general"]
+    ["Sector", "Distrito", "Combinación Distritos", "Pozo", "Ráster de costo", "Resumen general"],
+    key="modo"
 )
 escenario_sel = st.sidebar.selectbox(
-    "Seleccionar Escenario (% del caudal disponible por pozo)", [10, 20, 30]
+    "Seleccionar Escenario (% del caudal disponible por pozo)", ESCENARIOS
 )
 cisterna_sel = st.sidebar.radio("Seleccionar tipo de cisterna", list(cisternas.keys()))
 
-st.sidebar.markdown("**Consumo de combustible:** 6.0 gal/h")
-consumo_gal_h = 6.0
-st.sidebar.markdown("**Costo por galón:** S/ 20.00")
-costo_galon = 20.0
-st.sidebar.markdown("**Velocidad de referencia:** 30 km/h")
-velocidad_kmh = 30.0
+st.sidebar.markdown("**Parámetros de costo**")
+consumo_gal_h = st.sidebar.number_input("Consumo de combustible (gal/h)", min_value=0.0,
+                                        value=PARAMETROS_COSTO["consumo_gal_h"], step=0.5)
+costo_galon = st.sidebar.number_input("Costo por galón (S/)", min_value=0.0,
+                                      value=PARAMETROS_COSTO["costo_galon"], step=0.5)
+velocidad_kmh = st.sidebar.number_input("Velocidad de referencia (km/h)", min_value=1.0,
+                                        value=PARAMETROS_COSTO["velocidad_kmh"], step=1.0)
+
+with st.sidebar.expander("🚚 Flota mixta"):
+    st.caption("Factor de consumo por viaje (1 = consumo de referencia) y máximo de viajes/día "
+               "de cada tipo de cisterna en toda la ciudad (0 = sin límite). Los límites solo se "
+               "aplican al plan de todos los sectores (Resumen general → Flota mixta).")
+    factores_flota, limites_flota = {}, {}
+    for tipo in cisternas:
+        col_f, col_l = st.columns(2)
+        factores_flota[tipo] = col_f.number_input(f"Factor {tipo}", min_value=0.1, value=1.0, step=0.1,
+                                                  key=f"factor_{tipo}")
+        limites_flota[tipo] = col_l.number_input(f"Máx. viajes {tipo} (ciudad)", min_value=0, value=0, step=50,
+                                                 key=f"limite_{tipo}")
 
 # ========= FUNCIONES =========
-def normalizar(x):
-    return str(x).strip().upper().replace("Á","A").replace("É","E").replace("Í","I").replace("Ó","O").replace("Ú","U")
-
-def calcular_costos(aporte, dist_km, tipo_cisterna):
-    cap = cisternas[tipo_cisterna]["capacidad"]
-    viajes = int(aporte // cap + (aporte % cap > 0))
-    horas_por_viaje = (2.0 * dist_km) / max(velocidad_kmh, 1e-6)
-    consumo_por_viaje = horas_por_viaje * consumo_gal_h
-    costo_por_viaje = consumo_por_viaje * costo_galon
-    return viajes, viajes*costo_por_viaje, viajes*consumo_por_viaje
-
-def asignar_pozos(geom_obj, demanda, escenario, tipo_cisterna, pozos_gdf):
-    resultados, restante = [], demanda
-    total_viajes, total_costo, total_consumo = 0, 0.0, 0.0
-    pozos_tmp = []
-    for _, pozo in pozos_gdf.iterrows():
-        q_m3_dia = float(pozo.get("Q_m3_dia", 0.0))
-        if q_m3_dia > 0:
-            dist_km = pozo.geometry.distance(geom_obj) * 111.0
-            aporte_disp = q_m3_dia * (escenario / 100.0)
-            pozos_tmp.append((dist_km, pozo.get("ID","NA"), aporte_disp, pozo.geometry))
-    pozos_tmp.sort(key=lambda x: x[0])
-    for dist_km, pozo_id, aporte_disp, geom in pozos_tmp:
-        if restante <= 0: break
-        aporte_asignado = min(aporte_disp, restante)
-        viajes, costo, consumo = calcular_costos(aporte_asignado, dist_km, tipo_cisterna)
-        resultados.append([pozo_id, aporte_asignado, viajes, costo, consumo, round(dist_km,3), geom])
-        restante -= aporte_asignado
-        total_viajes += viajes; total_costo += costo; total_consumo += consumo
-    return resultados, restante, total_viajes, total_costo, total_consumo
+def costo_por_km():
+    # Galones y soles por km recorrido según los parámetros de la sidebar
+    return factores_costo(consumo_gal_h, costo_galon, velocidad_kmh)
+
+@st.cache_resource(show_spinner=False)
+def arreglos_pozos(_pozos_gdf):
+    return modelo_agua.arreglos_pozos(_pozos_gdf)
+
+@st.cache_resource(show_spinner=False)
+def indice_facetas(_pozos_gdf):
+    return IndiceFacetas(_pozos_gdf, arreglos_pozos(_pozos_gdf)[0])
+
+def mascara_filtro(filtro):
+    # Pozos elegibles a partir de la clave del filtro (bits empaquetados); None = todos
+    return indice_facetas(pozos_gdf).mascara(filtro)
+
+@st.cache_data(show_spinner=False)
+def asignacion_base(x, y, demanda, escenario, tipo_cisterna, _pozos, filtro=b""):
+    return asignar(x, y, demanda, escenario, tipo_cisterna, _pozos, mascara_filtro(filtro))
+
+def asignar_pozos(geom_obj, demanda, escenario, tipo_cisterna, pozos_gdf, objetivo=None):
+    # Devuelve la Asignacion valorizada con los parámetros de costo actuales.
+    # objetivo = (nivel, nombre): se lee del cubo de escenarios si está disponible (sin filtro de pozos)
+    usar_cubo = cubo() and objetivo and not filtro_pozos
+    resultados = cubo().asignacion(*objetivo, escenario, tipo_cisterna) if usar_cubo else None
+    if resultados is None:
+        resultados = asignacion_base(geom_obj.x, geom_obj.y, float(demanda), escenario, tipo_cisterna,
+                                     arreglos_pozos(pozos_gdf), filtro_pozos)
+    resultados.valorizar(*costo_por_km())
+    return (resultados, resultados.restante) + resultados.totales()
+
+@st.cache_data(show_spinner=False)
+def lote_base(nivel, escenario, tipo_cisterna, filtro=b""):
+    lote = cubo().lote(nivel, escenario, tipo_cisterna) if cubo() and not filtro else None
+    if lote is not None:
+        return lote
+    gdf = sectores_gdf if nivel == "Sector" else distritos_gdf
+    return asignar_lote(gdf, nivel, escenario, tipo_cisterna, arreglos_pozos(pozos_gdf), mascara_filtro(filtro))
+
+def resumen_costos(nivel, escenario, tipo_cisterna):
+    # Reescala la descomposición en caché con los parámetros de costo actuales
+    df = lote_base(nivel, escenario, tipo_cisterna, filtro_pozos)[0]
+    gal_km, soles_km = costo_por_km()
+    df = df.assign(Costo=df["Km"]*soles_km, Consumo=df["Km"]*gal_km,
+                   **{"Cobertura_%": (1 - df["Faltante"]/df["Demanda"])*100})
+    return df[[nivel, "Demanda", "Viajes", "Costo", "Consumo", "Faltante", "Cobertura_%"]]
+
+@st.cache_data(show_spinner=False)
+def indice_inverso(filtro=b""):
+    # Índice pozo -> objetivos: detalle de todos los niveles, escenarios y cisternas,
+    # ordenado por pozo, con el rango de filas de cada pozo para consultas directas
+    partes = []
+    for nivel in ["Sector", "Distrito"]:
+        for esc in ESCENARIOS:
+            for tipo in cisternas:
+                partes.append(lote_base(nivel, esc, tipo, filtro)[1].assign(Nivel=nivel, Escenario=esc, Cisterna=tipo))
+    df = (pd.concat(partes, ignore_index=True)
+          .sort_values(["Pozo_ID", "Nivel", "Escenario"], kind="stable").reset_index(drop=True))
+    ids = df["Pozo_ID"].to_numpy()
+    cortes = np.flatnonzero(np.diff(ids)) + 1
+    inicios = np.r_[0, cortes]; fines = np.r_[cortes, len(ids)]
+    rangos = {int(ids[a]): (int(a), int(b)) for a, b in zip(inicios, fines)}
+    return df, rangos
+
+def consultar_pozo(pozo_id):
+    df, rangos = indice_inverso(filtro_pozos)
+    a, b = rangos.get(pozo_id, (0, 0))
+    return df.iloc[a:b]
+
+def compromiso_pozos(escenario, tipo_cisterna):
+    # % de la capacidad disponible de cada pozo prometida a sectores y a distritos
+    df, _ = indice_inverso(filtro_pozos)
+    df = df[(df["Escenario"] == escenario) & (df["Cisterna"] == tipo_cisterna)]
+    comp = df.pivot_table(index="Pozo_ID", columns="Nivel", values="Aporte", aggfunc="sum", fill_value=0.0)
+    _, ids, _, _, q = arreglos_pozos(pozos_gdf)
+    capacidad = pd.Series(q * (escenario / 100.0), index=ids).reindex(comp.index)
+    comp = comp.div(capacidad, axis=0) * 100
+    return comp.reindex(columns=["Sector", "Distrito"], fill_value=0.0).rename_axis(columns=None)
+
+@st.cache_data(show_spinner=False)
+def flota_base(aporte, km, viajes, factores, limites):
+    # Mezcla óptima de cisternas para cada asignación pozo -> objetivo
+    dist = np.divide(km, 2.0 * viajes, out=np.zeros(len(km)), where=viajes > 0)
+    mezcla, factible, cota = flota_mixta(aporte, dist, dict(factores), dict(limites))
+    return mezcla, dist, factible, cota
+
+def tabla_flota(aporte, km, viajes, limites=None):
+    # Viajes por tipo, km, costo y consumo con la mezcla óptima y los parámetros actuales;
+    # limites ({tipo: viajes}, 0 = sin límite) solo para el plan de toda la ciudad.
+    # Devuelve además la brecha máxima (%) al óptimo cuando hay límites
+    aporte, km, viajes = (np.asarray(v, dtype=float) for v in (aporte, km, viajes))
+    mezcla, dist, factible, cota = flota_base(aporte, km, viajes, tuple(factores_flota.items()),
+                                              tuple((t, l) for t, l in (limites or {}).items() if l))
+    gal_km, soles_km = costo_por_km()
+    km_equiv = 2.0 * dist * (mezcla @ np.array([factores_flota[t] for t in cisternas]))
+    df = pd.DataFrame({f"Viajes {t}": mezcla[:, k] for k, t in enumerate(cisternas)})
+    df["Km"] = 2.0 * dist * mezcla.sum(axis=1)
+    df["Costo"], df["Consumo"] = km_equiv * soles_km, km_equiv * gal_km
+    brecha = max(1.0 - cota / km_equiv.sum(), 0.0) * 100 if km_equiv.sum() > 0 else 0.0
+    return df, dist, factible, brecha
+
+def costo_flota_unica(aporte, dist, tipo):
+    # Viajes y costo (S/) si toda la asignación se atiende con un solo tipo de cisterna
+    cap = cisternas[tipo]["capacidad"]
+    viajes = aporte // cap + (aporte % cap > 0)
+    return int(viajes.sum()), float((viajes * 2.0 * dist).sum() * factores_flota[tipo] * costo_por_km()[1])
+
+def mostrar_flota_mixta(resultados):
+    st.markdown("### 🚚 Flota mixta óptima")
+    st.caption("Combinación de cisternas de menor costo para cada pozo, según los factores de la sección "
+               "*Flota mixta* de la barra lateral (los límites de viajes son de toda la ciudad y no se "
+               "aplican a un solo objetivo).")
+    if len(resultados) == 0:
+        st.info("No hay pozos asignados.")
+        return
+    df, dist, _, _ = tabla_flota(resultados.aporte, resultados.km, resultados.viajes)
+    viajes_unica, costo_unica = costo_flota_unica(resultados.aporte, dist, cisterna_sel)
+    columnas_viajes = [f"Viajes {t}" for t in cisternas]
+    caps = np.array([cisternas[t]["capacidad"] for t in cisternas])
+    viajes_mezcla = int(df[columnas_viajes].to_numpy().sum())
+    ociosa = float((df[columnas_viajes].to_numpy() @ caps).sum() - resultados.aporte.sum())
+    c = st.columns(3)
+    c[0].metric("🚛 Viajes (mezcla)", f"{viajes_mezcla}",
+                delta=f"{viajes_mezcla - viajes_unica} vs solo {cisterna_sel}", delta_color="inverse")
+    c[1].metric("💵 Costo mezcla (S/)", f"{df['Costo'].sum():,.2f}",
+                delta=f"{df['Costo'].sum() - costo_unica:,.2f} vs solo {cisterna_sel}", delta_color="inverse")
+    c[2].metric("📦 Capacidad sin usar (m³)", f"{ociosa:,.1f}")
+    tabla = pd.concat([resultados.tabla()[["Pozo_ID", "Aporte", "Dist_km"]], df], axis=1)
+    st.dataframe(rename_columns(tabla).style.format({
+        "Aporte (m³/día)": "{:,.2f}", "Distancia (km)": "{:,.2f}", "Recorrido (km)": "{:,.1f}",
+        "Costo (Soles)": "{:,.2f}", "Consumo (galones)": "{:,.1f}"}), use_container_width=True)
 
 def rename_columns(df):
     mapping = {
@@ -127,6 +244,7 @@ def rename_columns(df):
         "Costo": "Costo (Soles)",
         "Consumo": "Consumo (galones)",
         "Dist_km": "Distancia (km)",
+        "Km": "Recorrido (km)",
         "Sector": "Sector",
         "Demanda": "Demanda (m³/día)",
         "Cobertura_%": "Cobertura (%)",
@@ -136,6 +254,7 @@ def rename_columns(df):
     return df.rename(columns={c: mapping.get(c,c) for c in df.columns})
 
 def plot_bar(df, x, y, title, xlabel, ylabel):
+    import plotly.express as px
     fig = px.bar(df, x=x, y=y, title=title, color=y,
                  color_continuous_scale=px.colors.sequential.Plasma, text_auto=True,
                  hover_data={y:":.2f"})
@@ -200,6 +319,7 @@ def agregar_conclusion(contexto, nombre, demanda, restante, viajes, costo, consu
     """, unsafe_allow_html=True)
 
 def agregar_leyenda(m):
+    import folium
     legend_html = """
     <div style="position: fixed; bottom: 20px; left: 20px; width: 220px;
                 background-color: white; border:2px solid grey; z-index:9999;
@@ -215,45 +335,192 @@ def agregar_leyenda(m):
     return m
 
 def dibujar_pozos(resultados, m):
-    df = pd.DataFrame(resultados, columns=["Pozo_ID","Aporte","Viajes","Costo","Consumo","Dist_km","geom"])
-    for _, row in df.iterrows():
-        geom = row["geom"]
-        if geom is not None:
-            folium.CircleMarker(
-                location=[geom.y, geom.x], radius=6, color="blue", fill=True, fill_opacity=0.7,
-                popup=(f"Pozo {row['Pozo_ID']}<br>"
-                       f"Aporte: {row['Aporte']:.2f} m³/día<br>"
-                       f"Viajes: {row['Viajes']}<br>"
-                       f"Costo: S/ {row['Costo']:.2f}<br>"
-                       f"Consumo: {row['Consumo']:.2f} gal<br>"
-                       f"Distancia: {row['Dist_km']} km")
-            ).add_to(m)
+    import folium
+    lat, lon = resultados.coordenadas(arreglos_pozos(pozos_gdf))
+    for i in range(len(resultados)):
+        folium.CircleMarker(
+            location=[lat[i], lon[i]], radius=6, color="blue", fill=True, fill_opacity=0.7,
+            popup=(f"Pozo {resultados.pozo_id[i]}<br>"
+                   f"Aporte: {resultados.aporte[i]:.2f} m³/día<br>"
+                   f"Viajes: {resultados.viajes[i]}<br>"
+                   f"Costo: S/ {resultados.costo[i]:.2f}<br>"
+                   f"Consumo: {resultados.consumo[i]:.2f} gal<br>"
+                   f"Distancia: {resultados.dist_km[i]} km")
+        ).add_to(m)
+    return m
+
+# --- Métricas del mapa general: columna, escala de color ---
+METRICAS_MAPA = {
+    "Cobertura (%)": "RdYlGn_09",
+    "Costo (Soles)": "YlOrRd_09",
+    "Faltante (m³/día)": "Reds_09",
+}
+RANGOS_MAPA = {"Cobertura (%)": (0.0, 100.0)}  # escala fija: 100 % siempre es verde
+
+@st.cache_data(show_spinner=False)
+def geometria_sectores_ligera(tolerancia=0.0002):
+    # Polígonos simplificados (~20 m) para dibujar todos los sectores en una sola capa
+    gdf = sectores_gdf[["ZONENAME", "geometry"]].copy()
+    gdf["geometry"] = gdf.geometry.simplify(tolerancia, preserve_topology=True)
+    return gdf
+
+def mapa_general(df_sec, metrica):
+    import folium
+    from branca.colormap import linear
+    gdf = geometria_sectores_ligera().merge(df_sec, left_on="ZONENAME", right_on="Sector", how="left")
+    valores = gdf[metrica]
+    vmin, vmax = RANGOS_MAPA.get(metrica, (valores.min(), valores.max()))
+    if not vmax > vmin:  # sin variación (o sin datos): se abre el rango para no pintar el extremo
+        vmin = 0.0 if pd.isna(vmin) else float(vmin)
+        vmax = vmin + 1.0
+    cmap = getattr(linear, METRICAS_MAPA[metrica]).scale(vmin, vmax)
+    cmap.caption = metrica
+    gdf["_color"] = [cmap(v) if pd.notna(v) else "#bdbdbd" for v in valores]
+    campos = ["ZONENAME", "Demanda (m³/día)", "Cobertura (%)", "Costo (Soles)", "Faltante (m³/día)"]
+    gdf[campos[1:]] = gdf[campos[1:]].round(2)
+
+    b = gdf.total_bounds
+    m = folium.Map(location=[(b[1]+b[3])/2, (b[0]+b[2])/2], zoom_start=10, tiles="cartodbpositron")
+    folium.GeoJson(
+        gdf[campos + ["_color", "geometry"]],
+        style_function=lambda f: {"fillColor": f["properties"]["_color"], "color": "#555",
+                                  "weight": 0.5, "fillOpacity": 0.75},
+        highlight_function=lambda f: {"weight": 2, "color": "#003366"},
+        tooltip=folium.GeoJsonTooltip(fields=campos, aliases=["Sector"] + campos[1:], localize=True),
+    ).add_to(m)
+    cmap.add_to(m)
     return m
 
+# --- Ráster de costo de abastecimiento ---
+def malla_raster(celda_m):
+    # Malla regular (centros de celda) sobre el área de los distritos; fila 0 = norte.
+    # Los límites son los bordes reales de las celdas (difieren de total_bounds hasta media celda)
+    lon_min, lat_min, lon_max, lat_max = distritos_gdf.total_bounds
+    dlat = celda_m / 111000.0
+    dlon = celda_m / (111000.0 * np.cos(np.radians((lat_min + lat_max) / 2)))
+    xs = np.arange(lon_min + dlon/2, lon_max, dlon)
+    ys = np.arange(lat_max - dlat/2, lat_min, -dlat)
+    return xs, ys, [[lat_max - len(ys) * dlat, lon_min], [lat_max, lon_min + len(xs) * dlon]]
+
+def podar_rasters(carpeta, max_mb=512, max_dias=7):
+    # Borra los rásteres más antiguos que max_dias y, por fecha de último uso, los que excedan
+    # max_mb en total; los temporales solo si llevan más de una hora (otra sesión puede escribirlos)
+    ahora = time.time()
+    archivos = []
+    for nombre in os.listdir(carpeta):
+        ruta = os.path.join(carpeta, nombre)
+        try:
+            info = os.stat(ruta)
+        except OSError:
+            continue
+        edad = ahora - info.st_mtime
+        if nombre.startswith(".tmp_"):
+            if edad > 3600:
+                archivos.append((0.0, 0, ruta))
+        elif edad > max_dias * 86400:
+            archivos.append((0.0, 0, ruta))
+        else:
+            archivos.append((info.st_mtime, info.st_size, ruta))
+    total = sum(tam for _, tam, _ in archivos)
+    for mtime, tam, ruta in sorted(archivos):
+        if mtime and total <= max_mb * 2**20:
+            break
+        try:
+            os.remove(ruta)
+        except OSError:
+            continue
+        total -= tam
+
+def raster_costo(celda_m, demanda, escenario, tipo_cisterna, memoria_mb=64):
+    # Evalúa la malla por bloques de memoria acotada y guarda km y faltante en un .npy
+    # mapeado en memoria (2 x filas x columnas, NaN fuera de los distritos)
+    from shapely import contains_xy
+    from shapely.ops import unary_union
+    pozos = arreglos_pozos(pozos_gdf)
+    _, _, px_, py_, q = pozos
+    mascara = mascara_filtro(filtro_pozos)
+    huella = hashlib.md5(b"".join(a.tobytes() for a in (px_, py_, q)) + filtro_pozos).hexdigest()[:10]
+    carpeta = os.path.join(tempfile.gettempdir(), "agua_raster")
+    ruta = os.path.join(carpeta, f"{huella}_{celda_m}m_{demanda:g}_{escenario}_{cisternas[tipo_cisterna]['capacidad']}.npy")
+    xs, ys, limites = malla_raster(celda_m)
+    if os.path.exists(ruta):
+        try:
+            os.utime(ruta)  # marca de último uso para la poda
+            return np.load(ruta, mmap_mode="r"), limites
+        except OSError:
+            pass  # podado por otra sesión: se recalcula
+
+    k = pozos_necesarios(pozos, demanda, escenario, mascara)
+    bloque = max(1, memoria_mb * 2**20 // (len(q) * 8 * 4))
+    area = unary_union(distritos_gdf.geometry)
+
+    os.makedirs(carpeta, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=carpeta, prefix=".tmp_", suffix=".npy")  # único por sesión
+    os.close(fd)
+    salida = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(2, len(ys), len(xs)))
+    salida[:] = np.nan
+    filas_bloque = max(1, bloque // len(xs))
+    for f0 in range(0, len(ys), filas_bloque):
+        gx, gy = np.meshgrid(xs, ys[f0:f0 + filas_bloque])
+        gx, gy = gx.ravel(), gy.ravel()
+        dentro = contains_xy(area, gx, gy)
+        if dentro.any():
+            _, km, falt = asignar_bloque(gx[dentro], gy[dentro], demanda, escenario, tipo_cisterna, pozos, k,
+                                         mascara)
+            for banda, valores in enumerate((km, falt)):
+                plano = np.full(gx.shape, np.nan, dtype=np.float32)
+                plano[dentro] = valores
+                salida[banda, f0:f0 + filas_bloque] = plano.reshape(-1, len(xs))
+    salida.flush(); del salida
+    podar_rasters(carpeta)  # antes de publicar: nunca borra el ráster recién calculado
+    os.replace(tmp, ruta)
+    return np.load(ruta, mmap_mode="r"), limites
+
+def imagen_raster(valores, cmap, max_px=800):
+    # Submuestrea el ráster y lo convierte a RGBA (transparente fuera del área)
+    paso = max(1, int(np.ceil(max(valores.shape) / max_px)))
+    v = np.asarray(valores[::paso, ::paso], dtype=float)
+    lut = np.array([cmap.rgba_bytes_tuple(t) for t in np.linspace(cmap.vmin, cmap.vmax, 256)], dtype=np.uint8)
+    norm = (v - cmap.vmin) / max(cmap.vmax - cmap.vmin, 1e-9)
+    img = lut[np.clip(np.nan_to_num(norm) * 255, 0, 255).astype(np.uint8)]
+    img[..., 3] = np.where(np.isnan(v), 0, 180)
+    return img
+
 # ========= CARGA DE DATOS =========
-sectores_gdf  = gpd.read_file(os.path.join(data_dir, "Sectores.geojson")).to_crs(epsg=4326)
-distritos_gdf = gpd.read_file(os.path.join(data_dir, "DISTRITOS_Final.geojson")).to_crs(epsg=4326)
-pozos_gdf     = gpd.read_file(os.path.join(data_dir, "Pozos.geojson")).to_crs(epsg=4326)
-demandas_sectores  = pd.read_csv(os.path.join(data_dir, "Demandas_Sectores_30lhd.csv"))
-demandas_distritos = pd.read_csv(os.path.join(data_dir, "Demandas_Distritos_30lhd.csv"))
-
-sectores_gdf["ZONENAME"] = sectores_gdf["ZONENAME"].apply(normalizar)
-demandas_sectores["ZONENAME"] = demandas_sectores["ZONENAME"].apply(normalizar)
-distritos_gdf["NOMBDIST"] = distritos_gdf["NOMBDIST"].apply(normalizar)
-demandas_distritos["Distrito"] = demandas_distritos["Distrito"].apply(normalizar)
-
-sectores_gdf = sectores_gdf.merge(demandas_sectores[["ZONENAME","Demanda_m3_dia"]], on="ZONENAME", how="left")
-distritos_gdf = distritos_gdf.merge(
-    demandas_distritos[["Distrito","Demanda_Distrito_m3_30_lhd"]],
-    left_on="NOMBDIST", right_on="Distrito", how="left"
-)
+@st.cache_resource(show_spinner=False)
+def datos():
+    return cargar_datos(DATA_DIR)
+
+sectores_gdf, distritos_gdf, pozos_gdf = datos()
+
+@st.cache_resource(show_spinner=False)
+def cubo():
+    # Cubo precalculado (python cubo_agua.py); None si no existe o no coincide con los datos
+    return cargar_cubo()
+
+# --- Filtro de pozos elegibles (convenios de emergencia) ---
+with st.sidebar.expander("🔎 Filtro de pozos"):
+    st.caption("Solo los pozos que cumplen todos los filtros participan en la asignación (vacío = todos).")
+    indice = indice_facetas(pozos_gdf)
+    filtros_pozos = {f: st.multiselect(f, valores, key=f"faceta_{f}") for f, valores in indice.valores.items()}
+filtro_pozos = indice.bits(filtros_pozos)
+if filtro_pozos:
+    st.sidebar.caption(f"🔎 {int(mascara_filtro(filtro_pozos).sum())} de {indice.n} pozos elegibles")
+
+if cubo() and not filtro_pozos:
+    st.sidebar.caption("⚡ Usando resultados precalculados (cubo de escenarios)")
 
 # ========= SECTOR =========
 if modo == "Sector":
+    import folium
+    from folium import plugins
+    from streamlit_folium import st_folium
+    import plotly.express as px
     sector_sel = st.sidebar.selectbox("Seleccionar sector", sorted(sectores_gdf["ZONENAME"].dropna().unique()))
     row = sectores_gdf[sectores_gdf["ZONENAME"] == sector_sel].iloc[0]
     demanda = float(row.get("Demanda_m3_dia",0))
-    resultados, restante, viajes, costo, consumo = asignar_pozos(row.geometry.centroid, demanda, escenario_sel, cisterna_sel, pozos_gdf)
+    resultados, restante, viajes, costo, consumo = asignar_pozos(row.geometry.centroid, demanda, escenario_sel, cisterna_sel, pozos_gdf,
+                                                                 objetivo=("Sector", sector_sel))
 
         # --- Contexto descriptivo adaptado ---
     if modo == "Sector":
@@ -275,7 +542,7 @@ if modo == "Sector":
     # Tabla
     st.markdown("### 📘 Resultados por pozo")
     st.caption("Pozos industriales asignados al sector, con aporte, viajes, consumo y costo.")
-    df_res = pd.DataFrame(resultados, columns=["Pozo_ID","Aporte","Viajes","Costo","Consumo","Dist_km","geom"]).drop(columns="geom")
+    df_res = resultados.tabla()
     df_res = rename_columns(df_res)
     styled_df = df_res.style.background_gradient(subset=["Aporte (m³/día)"], cmap="YlGnBu").format({
     "Aporte (m³/día)": "{:,.2f}",
@@ -284,6 +551,7 @@ if modo == "Sector":
     "Distancia (km)": "{:,.2f}"
 })
     st.dataframe(styled_df, use_container_width=True)
+    mostrar_flota_mixta(resultados)
 
     # Gráfico
     st.markdown("### 📊 Distribución del aporte por pozo")
@@ -311,7 +579,7 @@ if modo == "Sector":
 
     # --- ZONA DE CALOR (si se activa la casilla) ---
     if show_heat and len(resultados) > 0:
-        heat_data = [[r[6].y, r[6].x, r[3]] for r in resultados if r[6] is not None]
+        heat_data = resultados.capa_calor(arreglos_pozos(pozos_gdf))
         plugins.HeatMap(heat_data, radius=18, blur=25, max_zoom=10).add_to(m)
 
         # Leyenda específica para el mapa de calor
@@ -345,7 +613,8 @@ if modo == "Sector":
 
     for tipo in tipos_cisterna:
         for esc in escenarios:
-            _, restante_esc, _, costo_esc, _ = asignar_pozos(row.geometry.centroid, demanda, esc, tipo, pozos_gdf)
+            _, restante_esc, _, costo_esc, _ = asignar_pozos(row.geometry.centroid, demanda, esc, tipo, pozos_gdf,
+                                                             objetivo=("Sector", sector_sel))
             eficiencia_esc = ((demanda - restante_esc) / costo_esc) if costo_esc > 0 else 0
             comparacion_total.append({
                 "Escenario (%)": esc,
@@ -423,10 +692,15 @@ if modo == "Sector":
 
 # ========= DISTRITO =========
 elif modo == "Distrito":
+    import folium
+    from folium import plugins
+    from streamlit_folium import st_folium
+    import plotly.express as px
     dist_sel = st.sidebar.selectbox("Seleccionar distrito", sorted(distritos_gdf["NOMBDIST"].dropna().unique()))
     row = distritos_gdf[distritos_gdf["NOMBDIST"] == dist_sel].iloc[0]
     demanda = float(row.get("Demanda_Distrito_m3_30_lhd",0))
-    resultados, restante, viajes, costo, consumo = asignar_pozos(row.geometry.centroid, demanda, escenario_sel, cisterna_sel, pozos_gdf)
+    resultados, restante, viajes, costo, consumo = asignar_pozos(row.geometry.centroid, demanda, escenario_sel, cisterna_sel, pozos_gdf,
+                                                                 objetivo=("Distrito", dist_sel))
 
         # --- Contexto descriptivo adaptado ---
     if modo == "Sector":
@@ -447,7 +721,7 @@ elif modo == "Distrito":
 
     st.markdown("### 📘 Resultados por pozo")
     st.caption("Pozos industriales asignados al distrito, con aporte, viajes, consumo y costo.")
-    df_res = pd.DataFrame(resultados, columns=["Pozo_ID","Aporte","Viajes","Costo","Consumo","Dist_km","geom"]).drop(columns="geom")
+    df_res = resultados.tabla()
     df_res = rename_columns(df_res)
     styled_df = df_res.style.background_gradient(subset=["Aporte (m³/día)"], cmap="YlGnBu").format({
     "Aporte (m³/día)": "{:,.2f}",
@@ -456,6 +730,7 @@ elif modo == "Distrito":
     "Distancia (km)": "{:,.2f}"
 })
     st.dataframe(styled_df, use_container_width=True)
+    mostrar_flota_mixta(resultados)
 
     st.markdown("### 📊 Distribución del aporte por pozo")
     st.caption("Aporte diario de cada pozo industrial al distrito seleccionado.")
@@ -471,7 +746,7 @@ elif modo == "Distrito":
     folium.GeoJson(row.geometry, style_function=lambda x: {"color":"green","fillOpacity":0.2}).add_to(m)
     m = dibujar_pozos(resultados, m)
     if show_heat and len(resultados) > 0:
-        heat_data = [[r[6].y, r[6].x, r[3]] for r in resultados if r[6] is not None]
+        heat_data = resultados.capa_calor(arreglos_pozos(pozos_gdf))
         plugins.HeatMap(heat_data, radius=18).add_to(m)
     m = agregar_leyenda(m)
     st_folium(m, width=900, height=500)
@@ -491,7 +766,8 @@ elif modo == "Distrito":
 
     for tipo in tipos_cisterna:
         for esc in escenarios:
-            _, restante_esc, _, costo_esc, _ = asignar_pozos(row.geometry.centroid, demanda, esc, tipo, pozos_gdf)
+            _, restante_esc, _, costo_esc, _ = asignar_pozos(row.geometry.centroid, demanda, esc, tipo, pozos_gdf,
+                                                             objetivo=("Distrito", dist_sel))
             eficiencia_esc = ((demanda - restante_esc) / costo_esc) if costo_esc > 0 else 0
             comparacion_total.append({
                 "Escenario (%)": esc,
@@ -569,15 +845,16 @@ elif modo == "Distrito":
 
 # ========= COMBINACIÓN DE DISTRITOS =========
 elif modo == "Combinación Distritos":
-    criticos = ["ATE", "LURIGANCHO", "SAN_JUAN_DE_LURIGANCHO", "EL_AGUSTINO", "SANTA_ANITA"]
-    seleccion = st.sidebar.multiselect("Seleccionar combinación de distritos", criticos, default=criticos)
+    import folium
+    from folium import plugins
+    from streamlit_folium import st_folium
+    seleccion = st.sidebar.multiselect("Seleccionar combinación de distritos", CRITICOS, default=CRITICOS)
 
     if seleccion:
-        rows = distritos_gdf[distritos_gdf["NOMBDIST"].isin(seleccion)]
-        demanda = rows["Demanda_Distrito_m3_30_lhd"].sum()
-        geom_union = unary_union(rows.geometry)
+        geom_union, demanda = objetivo_combinacion(distritos_gdf, seleccion)
         resultados, restante, viajes, costo, consumo = asignar_pozos(
-            geom_union.centroid, demanda, escenario_sel, cisterna_sel, pozos_gdf
+            geom_union.centroid, demanda, escenario_sel, cisterna_sel, pozos_gdf,
+            objetivo=("Combinación", clave_combinacion(seleccion))
         )
 
         # --- Contexto descriptivo adaptado ---
@@ -600,10 +877,7 @@ elif modo == "Combinación Distritos":
         # --- Tabla de resultados ---
         st.markdown("### 📘 Resultados por pozo")
         st.caption("Pozos industriales utilizados para la combinación crítica de distritos.")
-        df_res = pd.DataFrame(
-            resultados,
-            columns=["Pozo_ID", "Aporte", "Viajes", "Costo", "Consumo", "Dist_km", "geom"]
-        ).drop(columns="geom")
+        df_res = resultados.tabla()
         df_res = rename_columns(df_res)
         styled_df = (
             df_res.style
@@ -616,6 +890,7 @@ elif modo == "Combinación Distritos":
             })
         )
         st.dataframe(styled_df, use_container_width=True)
+        mostrar_flota_mixta(resultados)
 
         # --- Gráfico del aporte ---
         st.markdown("### 📊 Distribución del aporte por pozo")
@@ -643,7 +918,7 @@ elif modo == "Combinación Distritos":
         folium.GeoJson(geom_union, style_function=lambda x: {"color": "purple", "fillOpacity": 0.2}).add_to(m)
         m = dibujar_pozos(resultados, m)
         if show_heat and len(resultados) > 0:
-            heat_data = [[r[6].y, r[6].x, r[3]] for r in resultados if r[6] is not None]
+            heat_data = resultados.capa_calor(arreglos_pozos(pozos_gdf))
             plugins.HeatMap(heat_data, radius=18, blur=25, max_zoom=10).add_to(m)
 
             # Leyenda del mapa de calor
@@ -674,25 +949,143 @@ elif modo == "Combinación Distritos":
             resultados
         )
 
+# ========= POZO =========
+elif modo == "Pozo":
+    import folium
+    from streamlit_folium import st_folium
+    import plotly.express as px
+    _, ids_pozos, _, _, q_pozos = arreglos_pozos(pozos_gdf)
+    mascara = mascara_filtro(filtro_pozos)
+    elegibles = ids_pozos if mascara is None else ids_pozos[mascara]
+    if len(elegibles) == 0:
+        st.warning("Ningún pozo cumple el filtro seleccionado.")
+        st.stop()
+    pozo_sel = st.sidebar.selectbox("Seleccionar pozo", sorted(int(i) for i in elegibles))
+    pozo = pozos_gdf[pozos_gdf["ID"] == pozo_sel].iloc[0]
+    q_pozo = float(q_pozos[ids_pozos == pozo_sel][0])
+    capacidad = q_pozo * (escenario_sel / 100.0)
+
+    st.markdown(
+        f"### 🧩 Contexto: Escenario {escenario_sel}% – Cisterna {cisterna_sel} – Nivel: Por pozo"
+    )
+
+    with st.spinner("Construyendo índice pozo → sectores/distritos..."):
+        usos = consultar_pozo(pozo_sel)
+    usos_sel = usos[(usos["Escenario"] == escenario_sel) & (usos["Cisterna"] == cisterna_sel)]
+    comp = compromiso_pozos(escenario_sel, cisterna_sel)
+    comp_pozo = comp.loc[pozo_sel] if pozo_sel in comp.index else pd.Series({"Sector": 0.0, "Distrito": 0.0})
+
+    st.markdown(f"<h3 style='color:#003366;'>🏭 Pozo {pozo_sel} – {pozo.get('Usuario', '')}</h3>", unsafe_allow_html=True)
+    fila1 = st.columns(3); fila2 = st.columns(3)
+    fila1[0].metric("💧 Capacidad disponible (m³/día)", f"{capacidad:,.2f}")
+    fila1[1].metric("📍 Sectores atendidos", f"{(usos_sel['Nivel'] == 'Sector').sum()}")
+    fila1[2].metric("🏙️ Distritos atendidos", f"{(usos_sel['Nivel'] == 'Distrito').sum()}")
+    fila2[0].metric("📍 Comprometido a sectores", f"{comp_pozo['Sector']:.1f}%")
+    fila2[1].metric("🏙️ Comprometido a distritos", f"{comp_pozo['Distrito']:.1f}%")
+    fila2[2].metric("🗂️ Distrito / Uso", f"{pozo.get('Distrito', '')} / {pozo.get('Uso', '')}")
+    if comp_pozo.max() > 100:
+        st.warning("⚠️ Pozo sobrecomprometido: la suma de aportes prometidos supera su capacidad disponible "
+                   "(cada sector o distrito se evalúa de forma independiente).")
+    st.caption("El compromiso suma los aportes asignados al pozo por todos los sectores (o distritos) analizados por separado.")
+
+    # Tabla de objetivos abastecidos
+    st.markdown("### 📘 Sectores y distritos abastecidos por el pozo")
+    gal_km, soles_km = costo_por_km()
+    df_usos = usos_sel.assign(Costo=usos_sel["Km"]*soles_km, Consumo=usos_sel["Km"]*gal_km)
+    df_usos = rename_columns(df_usos[["Nivel", "Objetivo", "Aporte", "Viajes", "Costo", "Consumo", "Dist_km"]])
+    st.dataframe(df_usos.style.format({
+        "Aporte (m³/día)": "{:,.2f}",
+        "Costo (Soles)": "{:,.2f}",
+        "Consumo (galones)": "{:,.2f}",
+        "Distancia (km)": "{:,.2f}"
+    }), use_container_width=True)
+
+    # Compromiso por escenario
+    st.markdown("### 📊 Capacidad comprometida por escenario")
+    df_esc = (usos[usos["Cisterna"] == cisterna_sel].groupby(["Escenario", "Nivel"], as_index=False)["Aporte"].sum())
+    df_esc["Comprometido (%)"] = df_esc["Aporte"] / (q_pozo * df_esc["Escenario"] / 100.0) * 100
+    fig_comp = px.bar(df_esc, x="Escenario", y="Comprometido (%)", color="Nivel", barmode="group",
+                      text_auto=".1f", title="Capacidad del pozo comprometida por escenario",
+                      color_discrete_map={"Sector": "#d62728", "Distrito": "#2ca02c"})
+    fig_comp.add_hline(y=100, line_dash="dash", line_color="#ef6c00")
+    fig_comp.update_layout(
+        plot_bgcolor="white",
+        font=dict(family="Segoe UI", size=13, color="#222"),
+        title=dict(font=dict(size=16, color="#003366")),
+        xaxis=dict(showgrid=True, gridcolor="lightgray", tickvals=ESCENARIOS),
+        yaxis=dict(showgrid=True, gridcolor="lightgray"),
+        xaxis_title="Escenario de redistribución (%)"
+    )
+    st.plotly_chart(fig_comp, use_container_width=True)
+
+    # Mapa del pozo y de los sectores abastecidos
+    st.markdown("### 🗺️ Ubicación espacial")
+    m = folium.Map(location=[pozo.geometry.y, pozo.geometry.x], zoom_start=12, tiles="cartodbpositron")
+    sect_usos = sectores_gdf[sectores_gdf["ZONENAME"].isin(usos_sel.loc[usos_sel["Nivel"] == "Sector", "Objetivo"])]
+    if len(sect_usos) > 0:
+        folium.GeoJson(sect_usos[["ZONENAME", "geometry"]], style_function=lambda x: {"color": "red", "fillOpacity": 0.3},
+                       tooltip=folium.GeoJsonTooltip(fields=["ZONENAME"], aliases=["Sector"])).add_to(m)
+    folium.CircleMarker(location=[pozo.geometry.y, pozo.geometry.x], radius=8, color="blue", fill=True,
+                        fill_opacity=0.9, popup=f"Pozo {pozo_sel}<br>Capacidad: {capacidad:.2f} m³/día").add_to(m)
+    m = agregar_leyenda(m)
+    st_folium(m, width=900, height=500)
+
+    # Pozos sobrecomprometidos
+    st.markdown("### 🚨 Pozos sobrecomprometidos")
+    st.caption("Pozos cuya capacidad disponible en el escenario seleccionado es prometida más de una vez.")
+    sobre = comp[(comp > 100).any(axis=1)].sort_values("Sector", ascending=False).reset_index()
+    sobre = sobre.rename(columns={"Pozo_ID": "N° Pozo", "Sector": "Sectores (%)", "Distrito": "Distritos (%)"})
+    st.dataframe(sobre.style.format({"Sectores (%)": "{:,.1f}", "Distritos (%)": "{:,.1f}"}), use_container_width=True)
+
+# ========= RÁSTER DE COSTO =========
+elif modo == "Ráster de costo":
+    import folium
+    from branca.colormap import linear
+    from streamlit_folium import st_folium
+    celda_m = st.sidebar.selectbox("Tamaño de celda (m)", [100, 250, 500], index=1)
+    demanda_punto = st.sidebar.number_input("Demanda por punto de distribución (m³/día)",
+                                            min_value=1.0, value=100.0, step=10.0)
+
+    st.markdown(
+        f"### 🧩 Contexto: Escenario {escenario_sel}% – Cisterna {cisterna_sel} – Nivel: Ráster de costo"
+    )
+    st.caption("Costo diario de abastecer un punto de distribución temporal ubicado en cada celda, "
+               "con los pozos más cercanos y la demanda indicada.")
+
+    with st.spinner("Calculando ráster por bloques..."):
+        raster, limites = raster_costo(celda_m, demanda_punto, escenario_sel, cisterna_sel)
+    gal_km, soles_km = costo_por_km()
+    costo_r = raster[0] * soles_km
+    validos = np.isfinite(raster[0])
+
+    fila1 = st.columns(3)
+    fila1[0].metric("🔲 Celdas evaluadas", f"{int(validos.sum()):,}")
+    fila1[1].metric("💵 Costo mínimo (S/)", f"{np.nanmin(costo_r):,.2f}")
+    fila1[2].metric("💵 Costo mediano (S/)", f"{np.nanmedian(costo_r):,.2f}")
+    if np.nanmax(raster[1]) > 0:
+        st.warning("⚠️ En algunas celdas la demanda no se cubre con el caudal disponible del escenario.")
+
+    vmin, vmax = np.nanpercentile(costo_r, [2, 98])
+    cmap = linear.YlOrRd_09.scale(float(vmin), float(vmax))
+    cmap.caption = "Costo de abastecimiento (S/ por día)"
+    centro = [(limites[0][0] + limites[1][0]) / 2, (limites[0][1] + limites[1][1]) / 2]
+    m = folium.Map(location=centro, zoom_start=10, tiles="cartodbpositron")
+    folium.raster_layers.ImageOverlay(imagen_raster(costo_r, cmap), bounds=limites,
+                                      mercator_project=True, name="Costo (S/)").add_to(m)
+    cmap.add_to(m)
+    st_folium(m, width=1000, height=650, returned_objects=[])
+    st.caption("⚠️ Los costos corresponden únicamente al consumo de combustible.")
+
 elif modo == "Resumen general":
+    import plotly.express as px
+    from streamlit_folium import st_folium
     st.subheader("📊 Resumen general")
-    tabs = st.tabs(["📍 Sectores", "🏙️ Distritos", "🌀 Combinación crítica", "🏆 Top 5"])
+    tabs = st.tabs(["📍 Sectores", "🏙️ Distritos", "🌀 Combinación crítica", "🏆 Top 5", "🗺️ Mapa general",
+                    "🚚 Flota mixta"])
 
     # ============== SECTORES ==============
     with tabs[0]:
-        resumen_sectores = []
-        for _, r in sectores_gdf.iterrows():
-            dem = float(r.get("Demanda_m3_dia", 0))
-            if dem > 0:
-                _, rest, via, cos, con = asignar_pozos(r.geometry.centroid, dem, escenario_sel, cisterna_sel, pozos_gdf)
-                cobertura = (1 - rest / dem) * 100 if dem > 0 else 0
-                resumen_sectores.append([r["ZONENAME"], dem, via, cos, con, rest, cobertura])
-
-        df_sec = pd.DataFrame(
-            resumen_sectores,
-            columns=["Sector", "Demanda", "Viajes", "Costo", "Consumo", "Faltante", "Cobertura_%"]
-        )
-        df_sec = rename_columns(df_sec)
+        df_sec = rename_columns(resumen_costos("Sector", escenario_sel, cisterna_sel))
 
         st.markdown("### 📍 Sectores")
         st.caption("Resumen por sector del costo y cobertura en el escenario seleccionado.")
@@ -715,19 +1108,7 @@ elif modo == "Resumen general":
 
     # ============== DISTRITOS ==============
     with tabs[1]:
-        resumen_distritos = []
-        for _, r in distritos_gdf.iterrows():
-            dem = float(r.get("Demanda_Distrito_m3_30_lhd", 0))
-            if dem > 0:
-                _, rest, via, cos, con = asignar_pozos(r.geometry.centroid, dem, escenario_sel, cisterna_sel, pozos_gdf)
-                cobertura = (1 - rest / dem) * 100 if dem > 0 else 0
-                resumen_distritos.append([r["NOMBDIST"], dem, via, cos, con, rest, cobertura])
-
-        df_dis = pd.DataFrame(
-            resumen_distritos,
-            columns=["Distrito", "Demanda", "Viajes", "Costo", "Consumo", "Faltante", "Cobertura_%"]
-        )
-        df_dis = rename_columns(df_dis)
+        df_dis = rename_columns(resumen_costos("Distrito", escenario_sel, cisterna_sel))
 
         st.markdown("### 🏙️ Distritos")
         st.caption("Resumen por distrito del costo y cobertura en el escenario seleccionado.")
@@ -750,11 +1131,12 @@ elif modo == "Resumen general":
 
     # ============== COMBINACIÓN CRÍTICA ==============
     with tabs[2]:
-        criticos = ["ATE", "LURIGANCHO", "SAN_JUAN_DE_LURIGANCHO", "EL_AGUSTINO", "SANTA_ANITA"]
+        criticos = CRITICOS
         filas = distritos_gdf[distritos_gdf["NOMBDIST"].isin(criticos)]
-        demanda = filas["Demanda_Distrito_m3_30_lhd"].sum()
+        geom_union, demanda = objetivo_combinacion(distritos_gdf, criticos)
         _, restante, viajes, costo, consumo = asignar_pozos(
-            unary_union(filas.geometry).centroid, demanda, escenario_sel, cisterna_sel, pozos_gdf
+            geom_union.centroid, demanda, escenario_sel, cisterna_sel, pozos_gdf,
+            objetivo=("Combinación", clave_combinacion(criticos))
         )
 
         st.markdown("### 🌀 Combinación crítica de distritos")
@@ -785,29 +1167,6 @@ elif modo == "Resumen general":
         st.markdown("### 🏆 Rankings operativos (costos)")
         colA, colB = st.columns(2)
 
-        # --- Asegurar que existan los dataframes ---
-        if 'df_sec' not in locals():
-            resumen_sectores = []
-            for _, r in sectores_gdf.iterrows():
-                dem = float(r.get("Demanda_m3_dia", 0))
-                if dem > 0:
-                    _, rest, via, cos, con = asignar_pozos(r.geometry.centroid, dem, escenario_sel, cisterna_sel, pozos_gdf)
-                    cobertura = (1 - rest / dem) * 100 if dem > 0 else 0
-                    resumen_sectores.append([r["ZONENAME"], dem, via, cos, con, rest, cobertura])
-            df_sec = rename_columns(pd.DataFrame(resumen_sectores,
-                          columns=["Sector", "Demanda", "Viajes", "Costo", "Consumo", "Faltante", "Cobertura_%"]))
-
-        if 'df_dis' not in locals():
-            resumen_distritos = []
-            for _, r in distritos_gdf.iterrows():
-                dem = float(r.get("Demanda_Distrito_m3_30_lhd", 0))
-                if dem > 0:
-                    _, rest, via, cos, con = asignar_pozos(r.geometry.centroid, dem, escenario_sel, cisterna_sel, pozos_gdf)
-                    cobertura = (1 - rest / dem) * 100 if dem > 0 else 0
-                    resumen_distritos.append([r["NOMBDIST"], dem, via, cos, con, rest, cobertura])
-            df_dis = rename_columns(pd.DataFrame(resumen_distritos,
-                          columns=["Distrito", "Demanda", "Viajes", "Costo", "Consumo", "Faltante", "Cobertura_%"]))
-
         # --- TOP 5 SECTORES ---
         with colA:
             st.markdown("#### 💰 Sectores más costosos (Top 5)")
@@ -915,3 +1274,46 @@ elif modo == "Resumen general":
                        ),
                 use_container_width=True
             )
+
+    # ============== MAPA GENERAL ==============
+    with tabs[4]:
+        st.markdown("### 🗺️ Mapa general de sectores")
+        st.caption("Todos los sectores coloreados según la métrica seleccionada para el escenario actual. "
+                   "Sectores en gris: sin demanda registrada.")
+        metrica_mapa = st.radio("Métrica a representar", list(METRICAS_MAPA.keys()),
+                                horizontal=True, key="metrica_mapa")
+        st_folium(mapa_general(df_sec, metrica_mapa), width=1100, height=650, returned_objects=[])
+
+    # ============== FLOTA MIXTA ==============
+    with tabs[5]:
+        st.markdown("### 🚚 Flota mixta óptima – todos los sectores")
+        st.caption("Mezcla de cisternas de menor costo para cada asignación pozo → sector de la ciudad, "
+                   "con los factores y límites de viajes de la barra lateral.")
+        detalle = lote_base("Sector", escenario_sel, cisterna_sel, filtro_pozos)[1]
+        aporte = detalle["Aporte"].to_numpy(dtype=float)
+        df_flota, dist, factible, brecha = tabla_flota(aporte, detalle["Km"], detalle["Viajes"], limites_flota)
+        if not factible:
+            st.warning("Los límites de viajes no alcanzan para atender toda la demanda asignada; "
+                       "se muestra la mezcla con menor exceso.")
+        columnas_viajes = [f"Viajes {t}" for t in cisternas]
+        comparacion = [{"Flota": f"Solo {t}", "Viajes": v, "Costo": c}
+                       for t in cisternas for v, c in [costo_flota_unica(aporte, dist, t)]]
+        comparacion.append({"Flota": "Mezcla óptima", "Viajes": int(df_flota[columnas_viajes].to_numpy().sum()),
+                            "Costo": float(df_flota["Costo"].sum())})
+        df_comp_flota = pd.DataFrame(comparacion)
+        c = st.columns(len(cisternas) + 1)
+        for col, t in zip(c, cisternas):
+            col.metric(f"🚛 Viajes {t}", f"{int(df_flota[f'Viajes {t}'].sum()):,}",
+                       help=f"Límite: {limites_flota[t] or 'sin límite'}")
+        ahorro = df_comp_flota["Costo"].iloc[:-1].min() - df_comp_flota["Costo"].iloc[-1]
+        c[-1].metric("💵 Ahorro vs mejor flota única (S/)", f"{ahorro:,.2f}")
+        if factible and any(limites_flota.values()):
+            st.caption(f"Con límites de viajes la mezcla es aproximada: su costo supera al óptimo en "
+                       f"{brecha:.2f} % como máximo (cota de la relajación lagrangiana).")
+        st.dataframe(rename_columns(df_comp_flota).style.format({"Costo (Soles)": "{:,.2f}"}),
+                     use_container_width=True)
+
+        por_sector = df_flota.groupby(detalle["Objetivo"].to_numpy())[columnas_viajes + ["Costo"]].sum()
+        st.markdown("#### Mezcla por sector")
+        st.dataframe(rename_columns(por_sector.rename_axis("Sector").reset_index())
+                     .style.format({"Costo (Soles)": "{:,.2f}"}), use_container_width=True)
@@ -0,0 +1,73 @@
+# ====================================================
+# PRESUPUESTO DE ARRANQUE DEL DASHBOARD
+# Uso: python medir_arranque.py [--repeticiones N]
+#
+# Mide, cada vez en un proceso nuevo (arranque en frío), el tiempo hasta que el
+# script de Streamlit termina de dibujar la pantalla de login y cada modo de
+# análisis, y lo compara con el presupuesto. Sale con código 1 si alguno lo excede.
+# ====================================================
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dashboard_agua.py")
+
+# Presupuesto en segundos (arranque en frío, sin caché de Streamlit)
+PRESUPUESTO_S = {
+    "Login": 0.8,
+    "Sector": 3.0,
+    "Distrito": 3.0,
+    "Combinación Distritos": 4.0,
+    "Pozo": 4.0,
+    "Ráster de costo": 4.0,
+    "Resumen general": 5.0,
+}
+
+# Se ejecuta en un proceso hijo: importa Streamlit, corre el script y reporta
+# el tiempo de la corrida y los módulos pesados que quedaron cargados
+_MEDICION = r"""
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+base = set(sys.modules)
+t1 = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=600)
+if sys.argv[2] != "Login":
+    at.session_state["auth"] = True
+    at.session_state["modo"] = sys.argv[2]
+at.run()
+t2 = time.perf_counter()
+pesados = ["geopandas", "shapely", "folium", "streamlit_folium", "plotly", "matplotlib", "branca"]
+print(json.dumps({
+    "segundos": t2 - t1,
+    "errores": [str(e.value) for e in at.exception],
+    "modulos": [m for m in pesados if m in sys.modules and m not in base],
+}))
+"""
+
+
+def medir(modo):
+    salida = subprocess.run([sys.executable, "-c", _MEDICION, SCRIPT, modo],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mide el arranque en frío del dashboard por modo")
+    parser.add_argument("--repeticiones", type=int, default=1, help="se reporta el mínimo de N corridas")
+    args = parser.parse_args()
+
+    excedidos = []
+    print(f"{'Pantalla':<24}{'Tiempo (s)':>11}{'Presupuesto':>13}  Módulos pesados cargados")
+    for modo, limite in PRESUPUESTO_S.items():
+        corridas = [medir(modo) for _ in range(args.repeticiones)]
+        r = min(corridas, key=lambda c: c["segundos"])
+        estado = "OK" if r["segundos"] <= limite and not r["errores"] else "EXCEDIDO"
+        if estado != "OK":
+            excedidos.append(modo)
+        print(f"{modo:<24}{r['segundos']:>11.2f}{limite:>13.1f}  {', '.join(r['modulos']) or '-'}  {estado}")
+        for e in r["errores"]:
+            print(f"    error: {e}")
+    sys.exit(1 if excedidos else 0)
@@ -0,0 +1,348 @@
+# ====================================================
+# MODELO: Asignación de pozos y costos de transporte
+# Núcleo compartido por el dashboard (dashboard_agua.py) y la API (api_agua.py)
+# ====================================================
+
+import os
+import numpy as np
+import pandas as pd
+
+# --- RUTA LOCAL ---
+DATA_DIR = os.path.join(os.path.dirname(__file__), "Datos_qgis")
+
+# --- CONFIG CISERNAS ---
+cisternas = {"19 m³": {"capacidad": 19}, "34 m³": {"capacidad": 34}}
+ESCENARIOS = [10, 20, 30]
+
+# --- COMBINACIÓN CRÍTICA DE DISTRITOS ---
+CRITICOS = ["ATE", "LURIGANCHO", "SAN_JUAN_DE_LURIGANCHO", "EL_AGUSTINO", "SANTA_ANITA"]
+
+# --- PARÁMETROS DE COSTO POR DEFECTO ---
+PARAMETROS_COSTO = {"consumo_gal_h": 6.0, "costo_galon": 20.0, "velocidad_kmh": 30.0}
+
+# --- NIVELES DE ANÁLISIS: columna de nombre, columna de demanda ---
+NIVELES = {
+    "Sector": ("ZONENAME", "Demanda_m3_dia"),
+    "Distrito": ("NOMBDIST", "Demanda_Distrito_m3_30_lhd"),
+}
+
+# --- FACETAS DEL INVENTARIO DE POZOS (filtros de elegibilidad) ---
+FACETAS = ["Clase", "Uso", "Fuente", "Distrito", "Usuario"]
+MAX_VALORES_BITMAP = 256  # facetas con más valores se filtran por código
+
+# ========= DATOS =========
+def normalizar(x):
+    return str(x).strip().upper().replace("Á","A").replace("É","E").replace("Í","I").replace("Ó","O").replace("Ú","U")
+
+def cargar_datos(data_dir=DATA_DIR):
+    # Sectores y distritos con su demanda diaria, y pozos (EPSG:4326)
+    import geopandas as gpd
+    sectores_gdf  = gpd.read_file(os.path.join(data_dir, "Sectores.geojson")).to_crs(epsg=4326)
+    distritos_gdf = gpd.read_file(os.path.join(data_dir, "DISTRITOS_Final.geojson")).to_crs(epsg=4326)
+    pozos_gdf     = gpd.read_file(os.path.join(data_dir, "Pozos.geojson")).to_crs(epsg=4326)
+    demandas_sectores  = pd.read_csv(os.path.join(data_dir, "Demandas_Sectores_30lhd.csv"))
+    demandas_distritos = pd.read_csv(os.path.join(data_dir, "Demandas_Distritos_30lhd.csv"))
+
+    sectores_gdf["ZONENAME"] = sectores_gdf["ZONENAME"].apply(normalizar)
+    demandas_sectores["ZONENAME"] = demandas_sectores["ZONENAME"].apply(normalizar)
+    distritos_gdf["NOMBDIST"] = distritos_gdf["NOMBDIST"].apply(normalizar)
+    demandas_distritos["Distrito"] = demandas_distritos["Distrito"].apply(normalizar)
+
+    sectores_gdf = sectores_gdf.merge(demandas_sectores[["ZONENAME","Demanda_m3_dia"]], on="ZONENAME", how="left")
+    distritos_gdf = distritos_gdf.merge(
+        demandas_distritos[["Distrito","Demanda_Distrito_m3_30_lhd"]],
+        left_on="NOMBDIST", right_on="Distrito", how="left"
+    )
+    return sectores_gdf, distritos_gdf, pozos_gdf
+
+def objetivo_combinacion(distritos_gdf, seleccion):
+    # Geometría unida y demanda total de una combinación de distritos
+    from shapely.ops import unary_union
+    rows = distritos_gdf[distritos_gdf["NOMBDIST"].isin(seleccion)]
+    return unary_union(rows.geometry), float(rows["Demanda_Distrito_m3_30_lhd"].sum())
+
+def clave_combinacion(seleccion):
+    # Nombre canónico (independiente del orden) de una combinación de distritos
+    return "|".join(sorted(seleccion))
+
+def arreglos_pozos(pozos_gdf):
+    # Pozos con caudal > 0 como arreglos: posición en el GeoDataFrame, ID, x, y, Q (m³/día)
+    q = pd.to_numeric(pozos_gdf["Q_m3_dia"], errors="coerce").fillna(0.0).to_numpy()
+    pos = np.flatnonzero(q > 0)
+    return (pos, pozos_gdf["ID"].to_numpy()[pos],
+            pozos_gdf.geometry.x.to_numpy()[pos], pozos_gdf.geometry.y.to_numpy()[pos], q[pos])
+
+# ========= FILTRO DE POZOS =========
+class IndiceFacetas:
+    """Índice de bits de los pozos de arreglos_pozos() por faceta (Clase, Uso, Fuente, ...).
+
+    Cada valor de una faceta guarda sus pozos como máscara empaquetada (np.packbits, 1 bit por
+    pozo). Un filtro {faceta: [valores]} es el OR de los valores dentro de cada faceta y el AND
+    entre facetas; bits() lo devuelve como bytes (clave de caché) y mascara() como arreglo
+    booleano para asignar(). Sin filtros: b"" y None (todos los pozos).
+    """
+
+    def __init__(self, pozos_gdf, pos=None):
+        pos = arreglos_pozos(pozos_gdf)[0] if pos is None else pos
+        self.n = len(pos)
+        self.valores, self._codigo, self._codigos, self._bits = {}, {}, {}, {}
+        for faceta in FACETAS:
+            if faceta not in pozos_gdf:
+                continue
+            codigos, valores = pd.factorize(pozos_gdf[faceta].fillna("(sin dato)").astype(str).to_numpy()[pos],
+                                            sort=True)
+            self.valores[faceta] = list(valores)
+            self._codigo[faceta] = {v: i for i, v in enumerate(valores)}
+            self._codigos[faceta] = codigos
+            if len(valores) <= MAX_VALORES_BITMAP:
+                self._bits[faceta] = np.packbits(codigos[None, :] == np.arange(len(valores))[:, None], axis=1)
+
+    def bits(self, filtros):
+        # Máscara empaquetada de los pozos que cumplen todos los filtros; b"" si no hay filtros
+        resultado = None
+        for faceta, elegidos in filtros.items():
+            if not elegidos:
+                continue
+            if faceta not in self._codigo:
+                raise ValueError(f"faceta desconocida: {faceta}; opciones: {list(self._codigo)}")
+            filas = []
+            for v in elegidos:
+                try:
+                    filas.append(self._codigo[faceta][v])
+                except (KeyError, TypeError):  # TypeError: valor no hashable (lista, objeto)
+                    raise ValueError(f"valor desconocido para {faceta}: {v}") from None
+            if faceta in self._bits:
+                fila = np.bitwise_or.reduce(self._bits[faceta][filas], axis=0)
+            else:
+                fila = np.packbits(np.isin(self._codigos[faceta], filas))
+            resultado = fila if resultado is None else resultado & fila
+        return b"" if resultado is None else resultado.tobytes()
+
+    def mascara(self, bits):
+        # Arreglo booleano (uno por pozo) a partir de bits(); None = todos los pozos
+        if not bits:
+            return None
+        return np.unpackbits(np.frombuffer(bits, dtype=np.uint8), count=self.n).astype(bool)
+
+
+# ========= COSTOS =========
+def factores_costo(consumo_gal_h, costo_galon, velocidad_kmh):
+    # Galones y soles por km recorrido
+    gal_km = consumo_gal_h / max(velocidad_kmh, 1e-6)
+    return gal_km, gal_km * costo_galon
+
+# ========= RESULTADO DE ASIGNACIÓN =========
+class Asignacion:
+    """Resultado columnar de asignar(): un arreglo por campo, una fila por pozo usado.
+
+    Los pozos se referencian por su índice en arreglos_pozos() (sin copiar geometrías).
+    Costo y consumo se obtienen con valorizar(), pues dependen de los parámetros de costo.
+    """
+
+    COLUMNAS = ["Pozo_ID", "Aporte", "Viajes", "Costo", "Consumo", "Dist_km"]
+
+    def __init__(self, idx, pozo_id, aporte, viajes, km, dist_km, demanda, restante):
+        self.idx, self.pozo_id, self.aporte = idx, pozo_id, aporte
+        self.viajes, self.km, self.dist_km = viajes, km, dist_km
+        self.demanda, self.restante = demanda, restante
+        self.costo = self.consumo = None
+
+    def __len__(self):
+        return len(self.idx)
+
+    def valorizar(self, gal_km, soles_km):
+        # Costo (S/) y consumo (gal) por pozo; devuelve el mismo objeto
+        self.costo, self.consumo = self.km * soles_km, self.km * gal_km
+        return self
+
+    def totales(self):
+        # viajes, costo, consumo
+        return int(self.viajes.sum()), float(self.costo.sum()), float(self.consumo.sum())
+
+    def tabla(self):
+        # DataFrame sobre los mismos arreglos (tabla, gráfico de barras)
+        return pd.DataFrame(dict(zip(self.COLUMNAS, (self.pozo_id, self.aporte, self.viajes,
+                                                      self.costo, self.consumo, self.dist_km))),
+                            copy=False)
+
+    def coordenadas(self, pozos):
+        # lat, lon de los pozos usados (capa de marcadores)
+        return pozos[3][self.idx], pozos[2][self.idx]
+
+    def capa_calor(self, pozos):
+        # [[lat, lon, costo], ...] para plugins.HeatMap
+        lat, lon = self.coordenadas(pozos)
+        return np.column_stack([lat, lon, self.costo]).tolist()
+
+
+# ========= ASIGNACIÓN =========
+def pozos_elegibles(pozos, mascara):
+    # x, y, Q de los pozos elegibles y su índice en arreglos_pozos() (None = todos)
+    _, _, px_, py_, q = pozos
+    if mascara is None:
+        return px_, py_, q, None
+    sel = np.flatnonzero(mascara)
+    return px_[sel], py_[sel], q[sel], sel
+
+def asignar(x, y, demanda, escenario, tipo_cisterna, pozos, mascara=None):
+    # Asignación por cercanía: los pozos (elegibles) más cercanos aportan hasta cubrir la
+    # demanda; viajes y km por pozo (el costo es lineal en estos km)
+    ids = pozos[1]
+    px_, py_, q, sel = pozos_elegibles(pozos, mascara)
+    cap = cisternas[tipo_cisterna]["capacidad"]
+    dx, dy = px_ - x, py_ - y
+    dist = np.sqrt(dx*dx + dy*dy) * 111.0
+    orden = np.argsort(dist, kind="stable")
+    disp = q[orden] * (escenario / 100.0)
+    acum = np.cumsum(disp)
+    n = min(int(np.searchsorted(acum, demanda)) + 1, len(acum)) if demanda > 0 else 0
+    usados = orden[:n]
+    idx = usados if sel is None else sel[usados]
+    aporte = disp[:n].copy()
+    if n and acum[n-1] >= demanda:
+        aporte[-1] = demanda - (acum[n-2] if n > 1 else 0.0)
+        restante = 0.0
+    else:
+        restante = demanda - (acum[n-1] if n else 0.0)
+    viajes = (aporte // cap + (aporte % cap > 0)).astype(np.int64)
+    return Asignacion(idx, ids[idx], aporte, viajes, viajes * 2.0 * dist[usados], np.round(dist[usados], 3),
+                      demanda, restante)
+
+def asignar_objetivos(gdf, nivel, escenario, tipo_cisterna, pozos, mascara=None):
+    # Asignación de cada sector o distrito con demanda: [(nombre, Asignacion), ...]
+    col_nombre, col_dem = NIVELES[nivel]
+    partes = []
+    for _, r in gdf.iterrows():
+        dem = float(r.get(col_dem, 0))
+        if dem > 0:
+            c = r.geometry.centroid
+            partes.append((r[col_nombre], asignar(c.x, c.y, dem, escenario, tipo_cisterna, pozos, mascara)))
+    return partes
+
+def tablas_lote(nivel, partes):
+    # Resumen por objetivo y detalle por pozo asignado (sin parámetros de costo)
+    resumen = pd.DataFrame(
+        [[n, a.demanda, int(a.viajes.sum()), float(a.km.sum()), a.restante] for n, a in partes],
+        columns=[nivel, "Demanda", "Viajes", "Km", "Faltante"])
+    detalle = pd.DataFrame({
+        "Objetivo": np.repeat([n for n, _ in partes], [len(a) for _, a in partes]),
+        **{col: np.concatenate([getattr(a, campo) for _, a in partes]) if partes else []
+           for col, campo in (("Pozo_ID", "pozo_id"), ("Aporte", "aporte"), ("Viajes", "viajes"),
+                              ("Km", "km"), ("Dist_km", "dist_km"))},
+    })
+    return resumen, detalle
+
+def asignar_lote(gdf, nivel, escenario, tipo_cisterna, pozos, mascara=None):
+    # Asignación de todos los sectores o distritos: resumen y detalle
+    return tablas_lote(nivel, asignar_objetivos(gdf, nivel, escenario, tipo_cisterna, pozos, mascara))
+
+def resto_flota(capacidades, pesos, excluir, largo):
+    # Combinación de menor peso de los tipos != excluir que cubre cada volumen entero 0..largo-1:
+    # viajes (largo, K) y peso (inf si no hay otros tipos)
+    caps = capacidades.astype(int)
+    peso = np.full(largo, np.inf); peso[0] = 0.0
+    viajes = np.zeros((largo, len(caps)))
+    for v in range(1, largo):
+        for k in range(len(caps)):
+            previo = max(v - caps[k], 0)
+            if k != excluir and peso[previo] + pesos[k] < peso[v]:
+                peso[v] = peso[previo] + pesos[k]
+                viajes[v] = viajes[previo]; viajes[v, k] += 1
+    return viajes, peso
+
+def opciones_flota(volumen, capacidades, pesos):
+    # Combinaciones candidatas (n, J, K) y si son válidas (n, J): para cada tipo k, ceil(v/c_k) - j
+    # viajes de k (j = 0..W) y el resto con la mejor combinación de los demás tipos. Con un tipo
+    # principal de mejor costo por m³, el óptimo usa menos de c_k viajes de los otros, así que la
+    # ventana W depende de las capacidades (no del volumen): J = K·(W + 1)
+    vol = np.ceil(np.asarray(volumen, dtype=float) - 1e-9)
+    W = int(capacidades.max()) + 1
+    j = np.arange(W + 1)
+    bloques, validas = [], []
+    for k, cap in enumerate(capacidades):
+        resto_v, resto_p = resto_flota(capacidades, pesos, k, W * int(cap) + 1)
+        n_k = np.maximum(np.ceil(vol[:, None] / cap) - j[None, :], 0.0)
+        r = np.maximum(vol[:, None] - n_k * cap, 0.0).astype(int)
+        opcion = resto_v[r]
+        opcion[:, :, k] += n_k
+        bloques.append(opcion); validas.append(np.isfinite(resto_p[r]))
+    return np.concatenate(bloques, axis=1), np.concatenate(validas, axis=1)
+
+def flota_mixta(aporte, dist_km, factores=None, limites=None, iteraciones=300):
+    """Mezcla de cisternas de menor costo para cada asignación pozo -> objetivo.
+
+    Un viaje del tipo k cuesta 2·dist_km·factores[k] km equivalentes (factor 1 = consumo de
+    referencia); a igual costo se prefiere mover menos capacidad vacía. limites = {tipo: máximo
+    de viajes en todo el plan; None = sin límite}: se respetan con un precio por viaje de cada
+    tipo limitado (relajación lagrangiana, ajustado por subgradiente) y se guarda la mejor
+    solución factible. Sin límites la mezcla es óptima; con límites es una aproximación (no se
+    resuelve el problema entero), acotada por la relajación: `cota` es un mínimo del costo
+    alcanzable, en km equivalentes, y (costo - cota) / costo es la brecha máxima al óptimo.
+    Las capacidades deben ser enteras (m³). Devuelve viajes (n, K) en el orden de `cisternas`,
+    si se cumplieron los límites y la cota (nan si no se cumplieron).
+    """
+    tipos = list(cisternas)
+    caps = np.array([cisternas[t]["capacidad"] for t in tipos], dtype=float)
+    f = np.array([(factores or {}).get(t, 1.0) for t in tipos], dtype=float)
+    lim = np.array([np.inf if (limites or {}).get(t) is None else limites[t] for t in tipos], dtype=float)
+    aporte, dist_km = np.asarray(aporte, dtype=float), np.asarray(dist_km, dtype=float)
+    if len(aporte) == 0:
+        return np.zeros((0, len(tipos)), dtype=np.int64), True, 0.0
+
+    opciones, validas = opciones_flota(aporte, caps, f + 1e-9 * caps)
+    base = 2.0 * dist_km[:, None] * (opciones @ f) + 1e-9 * (opciones @ caps)
+    base[~validas] = np.inf
+    filas = np.arange(len(aporte))
+    activos = np.flatnonzero(np.isfinite(lim))
+    precio = np.zeros(len(activos))
+    escala = base.min(axis=1).sum() / max(opciones.sum(axis=2).min(axis=1).sum(), 1.0)  # costo medio por viaje
+    mejor, menos_exceso, cota = None, None, 0.0
+    for it in range(iteraciones if len(activos) else 1):
+        costo_precio = base + sum(p * opciones[:, :, k] for k, p in zip(activos, precio) if p)
+        idx = np.argmin(costo_precio, axis=1)
+        elegido = opciones[filas, idx]
+        cota = max(cota, costo_precio[filas, idx].sum() - precio @ lim[activos])
+        exceso = elegido[:, activos].sum(axis=0) - lim[activos]
+        if (exceso <= 0).all():
+            costo = (2.0 * dist_km * (elegido @ f)).sum()
+            if mejor is None or costo < mejor[0]:
+                mejor = (costo, elegido)
+            if not (precio * exceso).any():  # holgura complementaria: óptimo
+                break
+        elif menos_exceso is None or exceso.clip(0).sum() < menos_exceso[0]:
+            menos_exceso = (exceso.clip(0).sum(), elegido)
+        precio = np.maximum(precio + escala * exceso / np.maximum(lim[activos], 1.0) / np.sqrt(it + 1), 0.0)
+    if mejor is None:
+        return menos_exceso[1].astype(np.int64), False, np.nan  # sin solución factible no hay brecha
+    return mejor[1].astype(np.int64), True, min(cota, mejor[0])
+
+def pozos_necesarios(pozos, demanda_max, escenario, mascara=None):
+    # Cota de pozos a revisar por punto: nº mínimo de pozos (los de menor caudal) que cubren la demanda
+    q = pozos[4] if mascara is None else pozos[4][mascara]
+    disp_orden = np.cumsum(np.sort(q) * (escenario / 100.0))
+    return min(int(np.searchsorted(disp_orden, demanda_max)) + 1, len(disp_orden))
+
+def asignar_bloque(cx, cy, demanda, escenario, tipo_cisterna, pozos, k=None, mascara=None):
+    # Versión vectorizada de asignar() para un bloque de puntos (demanda escalar o por punto):
+    # viajes, km recorridos y faltante por punto
+    px_, py_, q, _ = pozos_elegibles(pozos, mascara)
+    cap = cisternas[tipo_cisterna]["capacidad"]
+    dem = np.broadcast_to(np.asarray(demanda, dtype=float), cx.shape)[:, None]
+    if len(q) == 0:  # filtro sin pozos elegibles
+        return np.zeros(len(cx)), np.zeros(len(cx)), dem[:, 0].copy()
+    if k is None:
+        k = pozos_necesarios(pozos, float(dem.max(initial=0.0)), escenario, mascara)
+    dx = px_[None, :] - cx[:, None]; dy = py_[None, :] - cy[:, None]
+    dist = np.sqrt(dx*dx + dy*dy) * 111.0
+    if k < dist.shape[1]:
+        idx = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        dist = np.take_along_axis(dist, idx, axis=1)
+    else:
+        idx = np.broadcast_to(np.arange(dist.shape[1]), dist.shape)
+    orden = np.argsort(dist, axis=1, kind="stable")
+    dist = np.take_along_axis(dist, orden, axis=1)
+    disp = q[np.take_along_axis(idx, orden, axis=1)] * (escenario / 100.0)
+    acum = np.cumsum(disp, axis=1)
+    asignado = np.clip(dem - (acum - disp), 0.0, disp)
+    viajes = np.ceil(asignado / cap)
+    return viajes.sum(axis=1), (viajes * 2.0 * dist).sum(axis=1), np.maximum(dem[:, 0] - acum[:, -1], 0.0)
@@ -0,0 +1,260 @@
+# ====================================================
+# EJECUCIÓN PARTICIONADA PARA INVENTARIOS GRANDES (varias ALA / nivel nacional)
+# Uso:
+#   python particiones_agua.py --pozos RADA_1.csv RADA_2.geojson ... --objetivos SECTORES.csv ...
+#          --trabajo DIR [--tesela-km 50] [--halo-km 20] [--escenario 20] [--cisterna 19]
+#          [--procesos N | --scheduler tcp://host:8786]
+#   python particiones_agua.py --demo --trabajo DIR      (con los datos de Datos_qgis)
+#
+# 1. Particionar: los archivos se leen por bloques y cada fila se escribe en la
+#    carpeta de su tesela (cuadrícula de --tesela-km). Los pozos se replican en las
+#    teselas vecinas cuya franja de --halo-km los alcanza.
+# 2. Asignar: cada tesela se procesa por separado (un proceso por tesela, o un
+#    clúster dask.distributed con --scheduler; las carpetas deben estar en un disco
+#    compartido por los nodos).
+# 3. Fusionar: los resultados por tesela se concatenan en disco y el compromiso de
+#    cada pozo se suma entre teselas, sin cargar todo en memoria.
+#
+# Un objetivo es "exacto" cuando todos los pozos usados están dentro de la zona que
+# la tesela más el halo garantiza (su resultado coincide con el del modelo sin
+# particionar); si no, conviene aumentar --halo-km.
+# ====================================================
+
+import argparse
+import csv
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from modelo_agua import cisternas, factores_costo, PARAMETROS_COSTO, asignar, NIVELES, cargar_datos
+
+KM_GRADO = 111.0  # misma conversión que el modelo
+COLUMNAS_POZOS = ["pozo", "x", "y", "q"]
+COLUMNAS_OBJETIVOS = ["objetivo", "x", "y", "demanda"]
+COLUMNAS_RESULTADO = ["objetivo", "x", "y", "demanda", "pozos", "viajes", "km", "faltante",
+                      "cobertura_pct", "radio_km", "exacto", "tesela"]
+
+
+# ========= LECTURA POR BLOQUES =========
+def utm_a_grados(este, norte, zona):
+    # UTM sur (zona por fila, como la columna Zona del RADA) a lon/lat WGS84
+    from pyproj import Transformer
+    este, norte = np.asarray(este, dtype=float), np.asarray(norte, dtype=float)
+    zona = np.broadcast_to(np.asarray(zona, dtype=float), este.shape)
+    x, y = np.full(este.shape, np.nan), np.full(este.shape, np.nan)
+    for z in np.unique(zona[~np.isnan(zona)]):
+        sel = zona == z
+        x[sel], y[sel] = Transformer.from_crs(32700 + int(z), 4326, always_xy=True).transform(este[sel], norte[sel])
+    return x, y
+
+def coordenadas_csv(bloque, zona_utm):
+    # lon/lat de un bloque CSV: columnas x/y o lon/lat (grados), o Este/Norte (UTM sur; zona de
+    # la columna Zona o zona_utm)
+    if {"x", "y"} <= set(bloque):
+        return bloque["x"], bloque["y"]
+    if {"lon", "lat"} <= set(bloque):
+        return bloque["lon"], bloque["lat"]
+    if {"Este", "Norte"} <= set(bloque):
+        zona = bloque["Zona"].fillna(zona_utm) if "Zona" in bloque else zona_utm
+        return utm_a_grados(bloque["Este"], bloque["Norte"], zona)
+    raise ValueError(f"sin coordenadas: se esperan columnas x/y, lon/lat o Este/Norte "
+                     f"(columnas: {list(bloque.columns)})")
+
+def leer_por_bloques(ruta, col_id, col_valor, filas=200_000, zona_utm=18):
+    # Bloques de (id, x, y, valor) de un CSV (x/y o lon/lat en grados, o Este/Norte UTM) o de
+    # una capa vectorial (GeoJSON, shapefile: se usa el centroide)
+    prefijo = os.path.splitext(os.path.basename(ruta))[0]
+    if ruta.lower().endswith(".csv"):
+        for bloque in pd.read_csv(ruta, chunksize=filas):
+            x, y = coordenadas_csv(bloque, zona_utm)
+            yield _normalizar_bloque(prefijo, bloque, col_id, col_valor, x, y)
+        return
+    import geopandas as gpd
+    from pyogrio import read_info
+    total = read_info(ruta)["features"]
+    for inicio in range(0, total, filas):
+        bloque = gpd.read_file(ruta, skip_features=inicio, max_features=filas).to_crs(epsg=4326)
+        c = bloque.geometry.centroid if (bloque.geom_type != "Point").any() else bloque.geometry
+        yield _normalizar_bloque(prefijo, bloque, col_id, col_valor, c.x, c.y, inicio)
+
+def _normalizar_bloque(prefijo, bloque, col_id, col_valor, x, y, inicio=None):
+    if col_id in bloque:
+        ids = prefijo + ":" + bloque[col_id].astype(str)
+    else:
+        base = bloque.index if inicio is None else pd.RangeIndex(inicio, inicio + len(bloque))
+        ids = prefijo + ":" + pd.Series(base, index=bloque.index).astype(str)
+    valor = pd.to_numeric(bloque[col_valor], errors="coerce").fillna(0.0)
+    return pd.DataFrame({"id": ids.to_numpy(), "x": np.asarray(x, dtype=float),
+                         "y": np.asarray(y, dtype=float), "valor": valor.to_numpy()})
+
+
+# ========= 1. PARTICIONAR =========
+def _agregar(carpeta, nombre, columnas, df):
+    os.makedirs(carpeta, exist_ok=True)
+    ruta = os.path.join(carpeta, nombre)
+    df.to_csv(ruta, mode="a", header=not os.path.exists(ruta), index=False, columns=columnas)
+
+def particionar(rutas_pozos, rutas_objetivos, trabajo, tesela_km=50.0, halo_km=20.0,
+                col_pozo="ID", col_q="Q_m3_dia", col_objetivo="ZONENAME", col_demanda="demanda", zona_utm=18):
+    # Reparte pozos (con halo) y objetivos en carpetas por tesela; devuelve las teselas con objetivos
+    carpeta = os.path.join(trabajo, "teselas")
+    shutil.rmtree(carpeta, ignore_errors=True)
+    t, h = tesela_km / KM_GRADO, halo_km / KM_GRADO
+
+    for ruta in rutas_pozos:
+        for b in leer_por_bloques(ruta, col_pozo, col_q, zona_utm=zona_utm):
+            b = b[b["valor"] > 0].rename(columns={"id": "pozo", "valor": "q"})
+            x, y = b["x"].to_numpy(), b["y"].to_numpy()
+            ix0, ix1 = np.floor((x - h) / t).astype(int), np.floor((x + h) / t).astype(int)
+            iy0, iy1 = np.floor((y - h) / t).astype(int), np.floor((y + h) / t).astype(int)
+            # Cada pozo va a todas las teselas que alcanza su halo (3 x 3 si halo <= tesela)
+            nx, ny = int((ix1 - ix0).max(initial=0)) + 1, int((iy1 - iy0).max(initial=0)) + 1
+            for dx in range(nx):
+                for dy in range(ny):
+                    ix, iy = ix0 + dx, iy0 + dy
+                    sel = (ix <= ix1) & (iy <= iy1)
+                    for (tx, ty), parte in b[sel].groupby([ix[sel], iy[sel]]):
+                        _agregar(os.path.join(carpeta, f"{tx}_{ty}"), "pozos.csv", COLUMNAS_POZOS, parte)
+
+    teselas = set()
+    for ruta in rutas_objetivos:
+        for b in leer_por_bloques(ruta, col_objetivo, col_demanda, zona_utm=zona_utm):
+            b = b[b["valor"] > 0].rename(columns={"id": "objetivo", "valor": "demanda"})
+            ix, iy = np.floor(b["x"] / t).astype(int), np.floor(b["y"] / t).astype(int)
+            for (tx, ty), parte in b.groupby([ix, iy]):
+                _agregar(os.path.join(carpeta, f"{tx}_{ty}"), "objetivos.csv", COLUMNAS_OBJETIVOS, parte)
+                teselas.add(f"{tx}_{ty}")
+    return sorted(teselas)
+
+
+# ========= 2. ASIGNAR POR TESELA =========
+def procesar_tesela(tarea):
+    # Asigna todos los objetivos de una tesela con los pozos de la tesela + halo
+    carpeta, escenario, tipo_cisterna, tesela_km, halo_km = tarea
+    nombre = os.path.basename(carpeta)
+    tx, ty = (int(v) for v in nombre.split("_"))
+    t = tesela_km / KM_GRADO
+    ruta_pozos = os.path.join(carpeta, "pozos.csv")
+    pozos_df = pd.read_csv(ruta_pozos, dtype={"pozo": str}) if os.path.exists(ruta_pozos) \
+        else pd.DataFrame(columns=COLUMNAS_POZOS)
+    pozos = (np.arange(len(pozos_df)), pozos_df["pozo"].to_numpy(dtype=object),
+             pozos_df["x"].to_numpy(dtype=float), pozos_df["y"].to_numpy(dtype=float),
+             pozos_df["q"].to_numpy(dtype=float))
+
+    filas, compromiso = [], {}
+    for o in pd.read_csv(os.path.join(carpeta, "objetivos.csv"), dtype={"objetivo": str}).itertuples(index=False):
+        a = asignar(o.x, o.y, o.demanda, escenario, tipo_cisterna, pozos)
+        radio = float(a.dist_km.max()) if len(a) else 0.0
+        # Distancia garantizada: hasta el borde de la tesela más el halo
+        seguro = KM_GRADO * min(o.x - tx*t, (tx+1)*t - o.x, o.y - ty*t, (ty+1)*t - o.y) + halo_km
+        filas.append([o.objetivo, o.x, o.y, o.demanda, len(a), int(a.viajes.sum()), float(a.km.sum()),
+                      a.restante, (1 - a.restante/o.demanda)*100, radio,
+                      bool(radio <= seguro and a.restante <= 0), nombre])
+        for pozo_id, aporte in zip(a.pozo_id, a.aporte):
+            compromiso[pozo_id] = compromiso.get(pozo_id, 0.0) + aporte
+
+    pd.DataFrame(filas, columns=COLUMNAS_RESULTADO).to_csv(os.path.join(carpeta, "resultado.csv"), index=False)
+    pd.DataFrame({"pozo": list(compromiso), "aporte": list(compromiso.values())}).to_csv(
+        os.path.join(carpeta, "compromiso.csv"), index=False)
+    return nombre, len(filas), sum(1 for f in filas if not f[10])
+
+
+# ========= 3. FUSIONAR =========
+def fusionar(trabajo, teselas):
+    # Concatena los resultados por tesela y suma el compromiso de cada pozo entre teselas
+    carpeta = os.path.join(trabajo, "teselas")
+    salida = os.path.join(trabajo, "resultados.csv")
+    with open(salida, "w", newline="", encoding="utf-8") as out:
+        out.write(",".join(COLUMNAS_RESULTADO) + "\n")
+        for nombre in teselas:
+            with open(os.path.join(carpeta, nombre, "resultado.csv"), encoding="utf-8") as f:
+                next(f)
+                shutil.copyfileobj(f, out)
+
+    compromiso = {}
+    for nombre in teselas:
+        with open(os.path.join(carpeta, nombre, "compromiso.csv"), encoding="utf-8") as f:
+            for fila in csv.DictReader(f):
+                compromiso[fila["pozo"]] = compromiso.get(fila["pozo"], 0.0) + float(fila["aporte"])
+    ruta_comp = os.path.join(trabajo, "compromiso_pozos.csv")
+    with open(ruta_comp, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["pozo", "aporte_comprometido"])
+        w.writerows(compromiso.items())
+    return salida, ruta_comp
+
+
+def ejecutar(rutas_pozos, rutas_objetivos, trabajo, escenario=20, tipo_cisterna="19 m³",
+             tesela_km=50.0, halo_km=20.0, procesos=None, scheduler=None, **columnas):
+    t0 = time.time()
+    teselas = particionar(rutas_pozos, rutas_objetivos, trabajo, tesela_km, halo_km, **columnas)
+    t1 = time.time()
+    tareas = [(os.path.join(trabajo, "teselas", n), escenario, tipo_cisterna, tesela_km, halo_km)
+              for n in teselas]
+    if scheduler:
+        from dask.distributed import Client
+        with Client(scheduler) as cliente:
+            estados = list(cliente.get_executor().map(procesar_tesela, tareas))
+    else:
+        with ProcessPoolExecutor(max_workers=procesos or os.cpu_count()) as ex:
+            estados = list(ex.map(procesar_tesela, tareas))
+    t2 = time.time()
+    rutas = fusionar(trabajo, teselas)
+    print(f"{len(teselas)} teselas, {sum(e[1] for e in estados):,} objetivos "
+          f"({sum(e[2] for e in estados):,} no exactos o con faltante); "
+          f"particionar {t1-t0:.1f} s, asignar {t2-t1:.1f} s, fusionar {time.time()-t2:.1f} s")
+    return rutas
+
+
+def preparar_demo(trabajo):
+    # Exporta los pozos y los centroides de los sectores de Datos_qgis como entradas
+    sectores_gdf, _, pozos_gdf = cargar_datos()
+    os.makedirs(trabajo, exist_ok=True)
+    col_nombre, col_dem = NIVELES["Sector"]
+    c = sectores_gdf.geometry.centroid
+    ruta_obj = os.path.join(trabajo, "sectores.csv")
+    pd.DataFrame({"ZONENAME": sectores_gdf[col_nombre], "x": c.x, "y": c.y,
+                  "demanda": sectores_gdf[col_dem]}).to_csv(ruta_obj, index=False)
+    ruta_poz = os.path.join(trabajo, "pozos.csv")
+    pd.DataFrame({"ID": pozos_gdf["ID"], "x": pozos_gdf.geometry.x, "y": pozos_gdf.geometry.y,
+                  "Q_m3_dia": pozos_gdf["Q_m3_dia"]}).to_csv(ruta_poz, index=False)
+    return [ruta_poz], [ruta_obj]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Asignación particionada por teselas con halo")
+    parser.add_argument("--pozos", nargs="*", default=[], help="archivos de pozos (CSV o capa vectorial)")
+    parser.add_argument("--objetivos", nargs="*", default=[], help="archivos de sectores/puntos con demanda")
+    parser.add_argument("--trabajo", required=True, help="carpeta de trabajo (teselas y resultados)")
+    parser.add_argument("--demo", action="store_true", help="usar los datos de Datos_qgis")
+    parser.add_argument("--tesela-km", type=float, default=50.0)
+    parser.add_argument("--halo-km", type=float, default=20.0)
+    parser.add_argument("--escenario", type=float, default=20)
+    parser.add_argument("--cisterna", default="19", help="capacidad de la cisterna (m³)")
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--scheduler", default=None, help="dirección de un scheduler dask.distributed")
+    parser.add_argument("--col-pozo", default="ID")
+    parser.add_argument("--col-q", default="Q_m3_dia")
+    parser.add_argument("--col-objetivo", default="ZONENAME")
+    parser.add_argument("--col-demanda", default="demanda")
+    parser.add_argument("--zona-utm", type=int, default=18, help="zona UTM sur de Este/Norte sin columna Zona")
+    args = parser.parse_args()
+
+    tipo = next((k for k, v in cisternas.items() if str(v["capacidad"]) == args.cisterna.split()[0]), None)
+    if tipo is None:
+        parser.error(f"cisterna desconocida: {args.cisterna}")
+    rutas_pozos, rutas_objetivos = (preparar_demo(args.trabajo) if args.demo
+                                    else (args.pozos, args.objetivos))
+    if not rutas_pozos or not rutas_objetivos:
+        parser.error("indicar --pozos y --objetivos, o --demo")
+    resultados, compromiso = ejecutar(
+        rutas_pozos, rutas_objetivos, args.trabajo, args.escenario, tipo, args.tesela_km, args.halo_km,
+        args.procesos, args.scheduler, col_pozo=args.col_pozo, col_q=args.col_q,
+        col_objetivo=args.col_objetivo, col_demanda=args.col_demanda, zona_utm=args.zona_utm)
+    gal_km, soles_km = factores_costo(**PARAMETROS_COSTO)
+    print(f"Resultados: {resultados}\nCompromiso por pozo: {compromiso}\n"
+          f"(costo S/ = km x {soles_km:.2f}; consumo gal = km x {gal_km:.2f})")
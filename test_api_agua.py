@@ -0,0 +1,184 @@
+# ====================================================
+# Pruebas de la API y del motor de asignación contra los datos de Datos_qgis
+# Uso: python -m pytest -q
+# ====================================================
+
+import http.client
+import itertools
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from api_agua import MotorAsignacion, crear_servidor, TIPO_ARROW
+from modelo_agua import (
+    cisternas, factores_costo, PARAMETROS_COSTO, asignar, asignar_bloque,
+)
+
+GAL_KM, SOLES_KM = factores_costo(**PARAMETROS_COSTO)
+
+
+# ========= SERVIDOR =========
+@pytest.fixture(scope="module")
+def motor():
+    return MotorAsignacion()
+
+@pytest.fixture(scope="module")
+def servidor(motor):
+    srv = crear_servidor("127.0.0.1", 0, motor)
+    hilo = threading.Thread(target=srv.serve_forever, daemon=True)
+    hilo.start()
+    yield srv.server_address[1]
+    srv.shutdown()
+    srv.server_close()
+
+def pedir(puerto, metodo, ruta, cuerpo=None, cabeceras=None):
+    conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=30)
+    datos = None if cuerpo is None else (cuerpo if isinstance(cuerpo, bytes) else json.dumps(cuerpo).encode())
+    conexion.request(metodo, ruta, body=datos, headers=cabeceras or {})
+    r = conexion.getresponse()
+    estado, tipo, contenido = r.status, r.getheader("Content-Type"), r.read()
+    conexion.close()
+    return estado, tipo, contenido
+
+def pedir_json(puerto, metodo, ruta, cuerpo=None):
+    estado, _, contenido = pedir(puerto, metodo, ruta, cuerpo)
+    return estado, json.loads(contenido)
+
+
+# ========= ENDPOINTS =========
+def test_salud(servidor, motor):
+    estado, r = pedir_json(servidor, "GET", "/salud")
+    assert estado == 200 and r["estado"] == "ok"
+    assert r["pozos"] == len(motor.pozos[0]) > 0
+    assert r["sectores"] == len(motor.objetivos["Sector"])
+
+def test_ruta_desconocida(servidor):
+    assert pedir(servidor, "GET", "/nada")[0] == 404
+    assert pedir(servidor, "POST", "/nada", {})[0] == 404
+
+def test_asignar_por_sector(servidor, motor):
+    sector = next(n for n, (_, _, d) in motor.objetivos["Sector"].items() if d > 0)
+    x, y, demanda = motor.objetivos["Sector"][sector]
+    estado, r = pedir_json(servidor, "POST", "/asignar", {"sector": sector, "escenario": 20})
+    assert estado == 200
+    viajes, costo, consumo = asignar(x, y, demanda, 20, "19 m³", motor.pozos).valorizar(GAL_KM, SOLES_KM).totales()
+    assert r["viajes"] == viajes
+    assert r["costo"] == pytest.approx(costo) and r["consumo"] == pytest.approx(consumo)
+    assert r["demanda"] == pytest.approx(demanda)
+
+def test_asignar_por_punto(servidor, motor):
+    cuerpo = {"x": -76.95, "y": -12.05, "demanda": 1500, "escenario": 30, "cisterna": 34}
+    estado, r = pedir_json(servidor, "POST", "/asignar", cuerpo)
+    assert estado == 200
+    a = asignar(-76.95, -12.05, 1500, 30, "34 m³", motor.pozos).valorizar(GAL_KM, SOLES_KM)
+    assert (r["viajes"], len(r["pozos"])) == (a.totales()[0], len(a))
+    assert r["costo"] == pytest.approx(a.totales()[1])
+    assert [p["pozo_id"] for p in r["pozos"]] == a.pozo_id.tolist()
+
+def test_asignar_lote(servidor, motor):
+    rng = np.random.default_rng(1)
+    x, y = -77.1 + rng.random(50) * 0.3, -12.2 + rng.random(50) * 0.3
+    demanda = rng.uniform(10, 3000, 50)
+    cuerpo = {"x": x.tolist(), "y": y.tolist(), "demanda": demanda.tolist(), "escenario": 10}
+    estado, r = pedir_json(servidor, "POST", "/asignar/lote", cuerpo)
+    assert estado == 200
+    viajes, km, faltante = asignar_bloque(x, y, demanda, 10, "19 m³", motor.pozos)
+    res = r["resultados"]
+    assert [f["viajes"] for f in res] == viajes.astype(int).tolist()
+    assert np.allclose([f["costo"] for f in res], km * SOLES_KM)
+    assert np.allclose([f["faltante"] for f in res], faltante)
+
+def test_asignar_con_filtros(servidor, motor):
+    filtros = {"Fuente": ["Acuifero RIMAC"]}
+    estado, r = pedir_json(servidor, "POST", "/asignar", {"x": -76.95, "y": -12.05, "demanda": 800,
+                                                          "filtros": filtros})
+    assert estado == 200
+    elegibles = set(motor.pozos_gdf.loc[motor.pozos_gdf["Fuente"] == "Acuifero RIMAC", "ID"])
+    assert r["pozos"] and all(p["pozo_id"] in elegibles for p in r["pozos"])
+
+@pytest.mark.parametrize("cuerpo", [
+    {"x": "abc", "y": -12.0, "demanda": 10},
+    {"x": -77.0, "y": -12.0},
+    {"x": -77.0, "y": -12.0, "demanda": 10, "velocidad_kmh": 0},
+    {"x": -77.0, "y": -12.0, "demanda": 10, "escenario": 150},
+    {"x": -77.0, "y": -12.0, "demanda": 10, "cisterna": 25},
+    {"x": -77.0, "y": -12.0, "demanda": 10, "filtros": {"Color": ["rojo"]}},
+    {"x": -77.0, "y": -12.0, "demanda": 10, "filtros": {"Uso": ["Minero"]}},
+    {"x": -77.0, "y": -12.0, "demanda": 10, "filtros": {"Uso": [["Industrial"]]}},
+    {"x": -77.0, "y": -12.0, "demanda": 10, "cisterna": [19]},
+    {"sector": "NO_EXISTE"},
+    [1, 2, 3],
+])
+def test_solicitudes_invalidas(servidor, cuerpo):
+    estado, r = pedir_json(servidor, "POST", "/asignar", cuerpo)
+    assert estado == 400 and r["error"]
+
+def test_lote_invalido(servidor):
+    estado, _ = pedir_json(servidor, "POST", "/asignar/lote", {"x": [1, 2], "y": [1], "demanda": [1, 2]})
+    assert estado == 400
+    assert pedir(servidor, "POST", "/asignar", b"{no es json")[0] == 400
+
+def test_error_interno(servidor, motor, monkeypatch):
+    def falla(*args):
+        raise RuntimeError("falla")
+    monkeypatch.setattr(motor, "responder", falla)
+    conexion = http.client.HTTPConnection("127.0.0.1", servidor, timeout=30)
+    for _ in range(2):  # la conexión persistente sigue viva tras el 500
+        conexion.request("POST", "/asignar", body=b"{}")
+        r = conexion.getresponse()
+        assert r.status == 500 and json.loads(r.read())["error"]
+    conexion.close()
+
+def test_formato_arrow(servidor, motor):
+    pa = pytest.importorskip("pyarrow")
+    cuerpo = {"x": [-76.95, -77.0], "y": [-12.05, -12.1], "demanda": [500, 900]}
+    estado, tipo, contenido = pedir(servidor, "POST", "/asignar/lote?formato=arrow", cuerpo)
+    assert estado == 200 and tipo == TIPO_ARROW
+    tabla = pa.ipc.open_stream(contenido).read_all()
+    _, _, json_r = pedir(servidor, "POST", "/asignar/lote", cuerpo)
+    assert tabla.to_pylist() == pytest.approx(json.loads(json_r)["resultados"])
+    estado, tipo, _ = pedir(servidor, "POST", "/asignar", {"sector": next(iter(motor.objetivos["Sector"]))},
+                            {"Accept": TIPO_ARROW})
+    assert estado == 200 and tipo == TIPO_ARROW
+
+
+# ========= MOTOR: asignar vectorizado =========
+def asignar_referencia(x, y, demanda, escenario, tipo_cisterna, pozos):
+    # Versión de bucle (pozo por pozo) de la asignación por cercanía
+    _, ids, px_, py_, q = pozos
+    cap = cisternas[tipo_cisterna]["capacidad"]
+    dist = np.hypot(px_ - x, py_ - y) * 111.0
+    restante, filas = demanda, []
+    for i in np.argsort(dist, kind="stable"):
+        if restante <= 0:
+            break
+        aporte = min(q[i] * escenario / 100.0, restante)
+        restante -= aporte
+        viajes = int(aporte // cap + (aporte % cap > 0))
+        filas.append((ids[i], aporte, viajes, viajes * 2.0 * dist[i]))
+    return filas, max(restante, 0.0)
+
+@pytest.mark.parametrize("escenario,tipo", list(itertools.product([10, 20, 30], cisternas)))
+def test_asignar_igual_a_referencia(motor, escenario, tipo):
+    rng = np.random.default_rng(escenario)
+    for x, y, demanda in zip(-77.1 + rng.random(20) * 0.3, -12.2 + rng.random(20) * 0.3,
+                             rng.uniform(1, 20000, 20)):
+        a = asignar(x, y, demanda, escenario, tipo, motor.pozos)
+        filas, restante = asignar_referencia(x, y, demanda, escenario, tipo, motor.pozos)
+        assert a.pozo_id.tolist() == [f[0] for f in filas]
+        assert np.allclose(a.aporte, [f[1] for f in filas])
+        assert a.viajes.tolist() == [f[2] for f in filas]
+        assert np.allclose(a.km, [f[3] for f in filas])
+        assert max(a.restante, 0.0) == pytest.approx(restante, abs=1e-6)
+
+def test_asignar_bloque_igual_a_asignar(motor):
+    rng = np.random.default_rng(7)
+    x, y = -77.1 + rng.random(30) * 0.3, -12.2 + rng.random(30) * 0.3
+    demanda = rng.uniform(1, 5000, 30)
+    viajes, km, faltante = asignar_bloque(x, y, demanda, 20, "19 m³", motor.pozos)
+    for i in range(len(x)):
+        a = asignar(x[i], y[i], demanda[i], 20, "19 m³", motor.pozos)
+        assert viajes[i] == a.viajes.sum() and km[i] == pytest.approx(a.km.sum())
+        assert faltante[i] == pytest.approx(max(a.restante, 0.0), abs=1e-6)
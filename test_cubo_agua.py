@@ -0,0 +1,60 @@
+# ====================================================
+# Pruebas del cubo de escenarios (cubo_agua): construir, cargar y comparar con asignar
+# Uso: python -m pytest -q
+# ====================================================
+
+import numpy as np
+import pytest
+
+from cubo_agua import construir_cubo, cargar_cubo
+from modelo_agua import (
+    cisternas, ESCENARIOS, CRITICOS, NIVELES, cargar_datos, arreglos_pozos, asignar,
+    objetivo_combinacion, clave_combinacion,
+)
+
+
+@pytest.fixture(scope="module")
+def datos():
+    sectores_gdf, distritos_gdf, pozos_gdf = cargar_datos()
+    return sectores_gdf, distritos_gdf, arreglos_pozos(pozos_gdf)
+
+@pytest.fixture(scope="module")
+def cubo(tmp_path_factory):
+    ruta = construir_cubo(salida=str(tmp_path_factory.mktemp("cubo") / "cubo.npz"), procesos=2)
+    c = cargar_cubo(ruta)
+    assert c is not None
+    return c
+
+def objetivos(datos):
+    # (nivel, nombre, x, y, demanda) de todos los objetivos del cubo
+    sectores_gdf, distritos_gdf, _ = datos
+    for nivel, gdf in (("Sector", sectores_gdf), ("Distrito", distritos_gdf)):
+        col_nombre, col_dem = NIVELES[nivel]
+        for _, r in gdf[gdf[col_dem] > 0].iterrows():
+            c = r.geometry.centroid
+            yield nivel, r[col_nombre], c.x, c.y, float(r[col_dem])
+    geom, demanda = objetivo_combinacion(distritos_gdf, CRITICOS)
+    yield "Combinación", clave_combinacion(CRITICOS), geom.centroid.x, geom.centroid.y, demanda
+
+
+@pytest.mark.parametrize("escenario", ESCENARIOS)
+@pytest.mark.parametrize("tipo", list(cisternas))
+def test_cubo_igual_a_asignar(cubo, datos, escenario, tipo):
+    pozos = datos[2]
+    n = 0
+    for nivel, nombre, x, y, demanda in objetivos(datos):
+        a = asignar(x, y, demanda, escenario, tipo, pozos)
+        b = cubo.asignacion(nivel, nombre, escenario, tipo)
+        assert b is not None, (nivel, nombre)
+        assert b.pozo_id.tolist() == a.pozo_id.tolist()
+        assert b.viajes.tolist() == a.viajes.tolist()
+        assert np.allclose(b.aporte, a.aporte) and np.allclose(b.km, a.km)
+        assert (b.demanda, b.restante) == pytest.approx((a.demanda, a.restante))
+        n += 1
+    assert n > 400
+
+def test_cubo_desactualizado(cubo, tmp_path):
+    # Un cubo con otra huella de datos no se usa
+    assert cargar_cubo(str(tmp_path / "no_existe.npz")) is None
+    np.savez(tmp_path / "viejo.npz", meta=np.array('{"huella": "otra", "version": 1}'))
+    assert cargar_cubo(str(tmp_path / "viejo.npz")) is None
@@ -0,0 +1,55 @@
+# ====================================================
+# Pruebas del optimizador de flota mixta (modelo_agua.flota_mixta)
+# Uso: python -m pytest -q
+# ====================================================
+
+import itertools
+
+import numpy as np
+import pytest
+
+from modelo_agua import cisternas, flota_mixta
+
+
+# ========= FLOTA MIXTA =========
+def flota_fuerza_bruta(aporte, dist_km, factores):
+    # Costo mínimo enumerando todos los viajes de cada tipo hasta cubrir el aporte
+    caps = [cisternas[t]["capacidad"] for t in cisternas]
+    f = [factores.get(t, 1.0) for t in cisternas]
+    total = 0.0
+    for v, d in zip(aporte, dist_km):
+        rangos = [range(int(np.ceil(v / c)) + 1) for c in caps]
+        total += min(2 * d * np.dot(n, f) for n in itertools.product(*rangos) if np.dot(n, caps) >= v - 1e-9)
+    return total
+
+@pytest.mark.parametrize("factores", [{}, {"34 m³": 1.6}, {"34 m³": 2.5}])
+def test_flota_mixta_optima(factores):
+    rng = np.random.default_rng(3)
+    aporte, dist = rng.uniform(0.5, 400, 200), rng.uniform(0.1, 30, 200)
+    viajes, factible, cota = flota_mixta(aporte, dist, factores)
+    caps = np.array([cisternas[t]["capacidad"] for t in cisternas])
+    f = np.array([factores.get(t, 1.0) for t in cisternas])
+    assert factible and ((viajes @ caps) >= aporte - 1e-9).all()
+    costo = (2 * dist * (viajes @ f)).sum()
+    assert costo == pytest.approx(flota_fuerza_bruta(aporte, dist, factores)) == pytest.approx(cota)
+
+def test_flota_mixta_limites():
+    rng = np.random.default_rng(4)
+    aporte, dist = rng.uniform(0.5, 400, 500), rng.uniform(0.1, 30, 500)
+    libre, _, _ = flota_mixta(aporte, dist)
+    k = list(cisternas).index("34 m³")
+    limite = int(libre[:, k].sum() // 2)
+    viajes, factible, cota = flota_mixta(aporte, dist, limites={"34 m³": limite})
+    caps = np.array([cisternas[t]["capacidad"] for t in cisternas])
+    assert factible and viajes[:, k].sum() <= limite
+    assert ((viajes @ caps) >= aporte - 1e-9).all()
+    # La cota de la relajación acota el óptimo: sin límites <= cota <= costo de la mezcla
+    assert (2 * dist * libre.sum(axis=1)).sum() <= cota + 1e-6 <= (2 * dist * viajes.sum(axis=1)).sum() + 2e-6
+    # Sin cisternas de 34 m³ todo se cubre con las de 19 m³
+    viajes, factible, _ = flota_mixta(aporte, dist, limites={"34 m³": 0})
+    assert factible and viajes[:, k].sum() == 0
+
+def test_flota_mixta_limites_imposibles():
+    aporte, dist = np.array([100.0, 200.0]), np.array([5.0, 8.0])
+    viajes, factible, cota = flota_mixta(aporte, dist, limites={"19 m³": 1, "34 m³": 1})
+    assert not factible and np.isnan(cota) and viajes.shape == (2, len(cisternas))
@@ -0,0 +1,45 @@
+# ====================================================
+# Pruebas de la ejecución particionada (particiones_agua) con los datos de Datos_qgis
+# Uso: python -m pytest -q
+# ====================================================
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import particiones_agua as pa
+from modelo_agua import cargar_datos, arreglos_pozos, asignar_lote
+
+
+@pytest.mark.parametrize("tesela_km,halo_km", [(5.0, 3.0), (5.0, 12.0)])
+def test_exactos_igual_sin_particionar(tmp_path, tesela_km, halo_km):
+    # Todo objetivo marcado "exacto" coincide con el modelo sin particionar
+    sectores_gdf, _, pozos_gdf = cargar_datos()
+    referencia = asignar_lote(sectores_gdf, "Sector", 20, "19 m³", arreglos_pozos(pozos_gdf))[0]
+    trabajo = str(tmp_path / "trabajo")
+    rutas_pozos, rutas_objetivos = pa.preparar_demo(trabajo)
+    salida, _ = pa.ejecutar(rutas_pozos, rutas_objetivos, trabajo, escenario=20, tipo_cisterna="19 m³",
+                            tesela_km=tesela_km, halo_km=halo_km, procesos=2)
+    r = pd.read_csv(salida)
+    r["Sector"] = r["objetivo"].str.split(":", n=1).str[1]
+    m = r.merge(referencia, on="Sector")
+    exactos = m[m["exacto"]]
+    assert len(m) == len(referencia) and len(exactos) > 100
+    assert (exactos["viajes"] == exactos["Viajes"]).all()
+    assert np.allclose(exactos["km"], exactos["Km"])
+    assert np.allclose(exactos["faltante"], exactos["Faltante"])
+
+def test_coordenadas_este_norte(tmp_path):
+    # Un CSV con Este/Norte/Zona (sin x/y) se reproyecta a grados
+    _, _, pozos_gdf = cargar_datos()
+    ruta = tmp_path / "rada.csv"
+    pozos_gdf[["ID", "Este", "Norte", "Zona", "Q_m3_dia"]].to_csv(ruta, index=False)
+    b = next(pa.leer_por_bloques(str(ruta), "ID", "Q_m3_dia"))
+    assert np.allclose(b["x"], pozos_gdf.geometry.x, atol=1e-7)
+    assert np.allclose(b["y"], pozos_gdf.geometry.y, atol=1e-7)
+
+def test_sin_coordenadas(tmp_path):
+    ruta = tmp_path / "malo.csv"
+    pd.DataFrame({"ID": [1], "Q_m3_dia": [5.0]}).to_csv(ruta, index=False)
+    with pytest.raises(ValueError, match="sin coordenadas"):
+        next(pa.leer_por_bloques(str(ruta), "ID", "Q_m3_dia"))